@@ -0,0 +1,86 @@
+"""
+ESPER Tool Startup Benchmark
+
+Times how long the CLI takes to start and checks that importing it doesn't pull in
+modules only some subcommands need. Exits non-zero when either regresses, so it can
+run as part of a release check:
+
+    python benchmarks/startup.py [--runs N] [--max-ms MS]
+"""
+
+# Added for python2 compat
+from __future__ import (absolute_import, division, print_function, unicode_literals)
+
+import os
+import sys
+import argparse
+import subprocess
+import time
+
+# Only loaded by the subcommands that use them, importing the CLI must not load any.
+# binary, monitor, config and fleet are fine to load, the argument parser needs their
+# format and action names, but they must not drag numpy in with them.
+LAZY_MODULES = (
+    'numpy',
+    'cmd',
+    'getpass',
+    'esper_tool.esper',
+    'esper_tool.interactive',
+    'esper_tool.compare',
+    'esper_tool.recorder',
+    'esper_tool.aio',
+    'requests',
+)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LOADED_SCRIPT = "import sys, esper_tool.__main__; print(' '.join(sorted(sys.modules)))"
+
+
+def run_ms(args):
+    """Wall clock milliseconds a fresh interpreter takes to run args"""
+    start = time.time()
+    with open(os.devnull, 'w') as devnull:
+        subprocess.check_call([sys.executable] + args, cwd=ROOT, stdout=devnull)
+    return (time.time() - start) * 1000.0
+
+
+def median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    if(len(values) % 2):
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure esper-tool startup time')
+    parser.add_argument('--runs', default=10, type=int, help='Runs to take the median of (default: 10)')
+    parser.add_argument('--max-ms', default=None, type=float, help='Fail if the CLI median exceeds this many milliseconds')
+    args = parser.parse_args()
+
+    failed = False
+
+    loaded = subprocess.check_output([sys.executable, '-c', LOADED_SCRIPT], cwd=ROOT).decode('utf-8').split()
+    eager = [module for module in LAZY_MODULES if module in loaded]
+    if(eager):
+        print('Loaded on import, should be lazy: %s' % ', '.join(eager))
+        failed = True
+
+    baseline = median([run_ms(['-c', 'pass']) for n in range(args.runs)])
+    imported = median([run_ms(['-c', 'import esper_tool.__main__']) for n in range(args.runs)])
+    cli = median([run_ms(['-m', 'esper_tool', '--version']) for n in range(args.runs)])
+
+    print('interpreter           %7.1f ms' % baseline)
+    print('import esper_tool     %7.1f ms (+%.1f)' % (imported, imported - baseline))
+    print('esper-tool --version  %7.1f ms (+%.1f)' % (cli, cli - baseline))
+
+    if((args.max_ms is not None) and (cli > args.max_ms)):
+        print('Startup took %.1f ms, limit is %.1f ms' % (cli, args.max_ms))
+        failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
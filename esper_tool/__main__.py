@@ -5,61 +5,27 @@
 from __future__ import (absolute_import, division, print_function, unicode_literals)
 # from builtins import *
 
+# Only what every command needs is imported here. Scripts run read/write thousands
+# of times, so anything heavy (numpy, the interactive shell, UDP discovery) is
+# imported by the commands that use it. That includes requests, which commands
+# routed through a running daemon never need
 import os
 import sys
-import requests
 import argparse
-import cmd
 import time
 import json
-import getpass
-import re
-import time
-import datetime
-import numpy as np
-from . import esper
+from .binary import BINARY_FORMATS
+from .monitor import WATCH_FORMATS, parse_rate
+from .varspec import parse_var_spec
+from .client import EsperClient, EsperError, DEFAULT_POOL_SIZE, normalize_url
+from .metadata import MetadataCache, DEFAULT_TTL
+from .fleet import FLEET_ACTIONS
 from .version import __version__
 
 here = os.path.abspath(os.path.dirname(__file__))
 version = __version__
 
 
-def request_get_with_auth(url, params, user, password, timeout_in_seconds):
-    try:
-        if(user):
-            return requests.get(url, params=params, auth=(user, password), timeout=timeout_in_seconds)
-        else:
-            return requests.get(url, params=params, timeout=timeout_in_seconds)
-
-    except requests.exceptions.Timeout:
-        print("Timed out making request")
-        r = requests.Response()
-        r.status_code = 408
-        return r
-
-    except requests.exceptions.RequestException:
-        print("Unable to connect to " + str(url))
-        sys.exit(1)
-
-
-def request_post_with_auth(url, params, payload, user, password, timeout_in_seconds):
-    try:
-        if(user):
-            return requests.post(url, params=params, data=payload, auth=(user, password), timeout=timeout_in_seconds)
-        else:
-            return requests.post(url, params=params, data=payload, timeout=timeout_in_seconds)
-
-    except requests.exceptions.Timeout:
-        print("Timed out making request")
-        r = requests.Response()
-        r.status_code = 408
-        return r
-
-    except requests.exceptions.RequestException:
-        print("Unable to connect to " + str(url))
-        sys.exit(1)
-
-
 def set_default_subparser(self, name, args=None):
     """default subparser selection. Call after setup, just before parse_args()
     name: is the name of the subparser to call by default
@@ -91,647 +57,6 @@ def set_default_subparser(self, name, args=None):
                 args.insert(0, name)
 
 
-class Esper(object):
-    ESPER_TYPE_NULL = 0
-
-    def getTypeString(self, esper_type):
-        options = {
-            0: "null",
-            1: "uint8",
-            2: "uint16",
-            3: "uint32",
-            4: "uint64",
-            5: "sint8",
-            6: "sint16",
-            7: "sint32",
-            8: "sint64",
-            9: "float32",
-            10: "float64",
-            11: "ascii",
-            12: "bool",
-            13: "raw"
-        }
-        return options.get(esper_type, "unknown")
-
-    def getOptionString(self, esper_option):
-        retStr = ""
-        if(esper_option & 0x01):
-            retStr = retStr + "R"
-        else:
-            retStr = retStr + " "
-
-        if(esper_option & 0x02):
-            retStr = retStr + "W"
-        else:
-            retStr = retStr + " "
-
-        if(esper_option & 0x04):
-            retStr = retStr + "H"
-        else:
-            retStr = retStr + " "
-
-        if(esper_option & 0x08):
-            retStr = retStr + "S"
-        else:
-            retStr = retStr + " "
-
-        if(esper_option & 0x10):
-            retStr = retStr + "L"
-        else:
-            retStr = retStr + " "
-
-        if(esper_option & 0x20):
-            retStr = retStr + "W"
-        else:
-            retStr = retStr + " "
-
-        return retStr
-
-    def getStatusString(self, esper_status):
-        retStr = ""
-        if(esper_status & 0x01):
-            retStr = retStr + "L"
-        else:
-            retStr = retStr + " "
-
-        if(esper_status & 0x02):
-            retStr = retStr + "S"
-        else:
-            retStr = retStr + " "
-
-        if(esper_status & 0x04):
-            retStr = retStr + "D"
-        else:
-            retStr = retStr + " "
-
-        return retStr
-
-
-def pretty_time_delta(seconds):
-    seconds = int(seconds)
-    days, seconds = divmod(seconds, 86400)
-    hours, seconds = divmod(seconds, 3600)
-    minutes, seconds = divmod(seconds, 60)
-    if days > 0:
-        return '%dd %dh %dm %ds' % (days, hours, minutes, seconds)
-    elif hours > 0:
-        return '0d %dh %dm %ds' % (hours, minutes, seconds)
-    elif minutes > 0:
-        return '0d 0h %dm %ds' % (minutes, seconds)
-    else:
-        return '0d 0h 0m %ds' % (seconds)
-
-
-class InteractiveMode(cmd.Cmd):
-    """Interactive Mode"""
-
-    def emptyline(self):
-        pass
-
-    def do_timeout(self, line):
-        """Purpose: Adjust HTTP request timeout length\nUsage: timeout <seconds>\nExample: timeout 0.5\n"""
-        line_args = str.split(line, ' ')
-        if(line_args[0] == ''):
-            print("Current timeout period is " + str(self.timeout))
-        else:
-            self.timeout = float(line_args[0])
-            print("Timeout period is now " + str(self.timeout))
-
-    def print_esper_error(self, err_json):
-        try:
-            print("Error %d: %s (%d)" % (err_json['error']['status'], err_json['error']['meaning'], err_json['error']['code']))
-        except:
-            print("Unknown Error Format")
-
-    def get_module_variables(self):
-        querystring = {'mid': self.module, 'includeVars': 'y'}
-        r = request_get_with_auth(self.url + '/read_module', querystring, self.user, self.password, self.timeout)
-        self.var_completion = []
-        if(r.status_code == 200):
-            resp = r.json()
-            for i in range(0, len(resp['var'])):
-                self.var_completion.append(resp['var'][i]['key'])
-
-    def get_modules(self):
-        querystring = {'includeMods': 'y'}
-        r = request_get_with_auth(self.url + '/read_node', querystring, self.user, self.password, self.timeout)
-        self.mod_completion = []
-        if(r.status_code == 200):
-            resp = r.json()
-            for i in range(0, len(resp['module'])):
-                self.mod_completion.append(resp['module'][i]['key'])
-
-    def do_version(self, line):
-        """Purpose: Prints current version of esper-tool\nUsage: version\n"""
-        print(self.prog + ' ' + __version__)
-
-    def do_uptime(self, line):
-        """Purpose: Get uptime of current ESPER service\nUsage: uptime\n"""
-        querystring = {'mid': 'system', 'vid': 'uptime', 'dataOnly': 'y'}
-        try:
-            r = request_get_with_auth(self.url + '/read_var', querystring, self.user, self.password, self.timeout)
-            if(r.status_code == 200):
-                print('Uptime: ' + pretty_time_delta(r.json()[0]))
-            elif(r):
-                self.print_esper_error(r.json())
-
-        except requests.exceptions.RequestException as e:
-            print("Error: {}".format(e))
-
-    def do_list(self, line):
-        """Purpose: Lists available modules\nUsage: list\n"""
-        try:
-            querystring = {'includeMods': 'y'}
-            r = request_get_with_auth(self.url + '/read_node', querystring, self.user, self.password, self.timeout)
-
-            if(r.status_code == 200):
-                resp = r.json()
-                print('%-5s %-16s %-32s' % ('mid', 'key', 'name'))
-                print('%-5s %-16s %-32s' % ('---', '---', '----'))
-                for i in range(0, len(resp['module'])):
-                    print('%-5s %-16s %-32s' % (str(resp['module'][i]['id']), resp['module'][i]['key'], resp['module'][i]['name']))
-
-            elif(r):
-                self.print_esper_error(r.json())
-
-        except requests.exceptions.RequestException as e:
-            print("Error: {}".format(e))
-
-    def complete_cd(self, content, line, begidx, endidx):
-        if content:
-            return [
-                module for module in self.mod_completion
-                if module.startswith(content)
-            ]
-        else:
-            return self.mod_completion
-
-    def do_cd(self, line):
-        """Purpose: Sets current module\nUsage: cd <mid>\n"""
-        self.do_module(line)
-
-    def complete_module(self, content, line, begidx, endidx):
-        if content:
-            return [
-                module for module in self.mod_completion
-                if module.startswith(content)
-            ]
-        else:
-            return self.mod_completion
-
-    def do_module(self, line):
-        """Purpose: Sets current module\nUsage: module <mid>\n"""
-        if(line):
-            line_args = str.split(line)
-            # remove starting / if it exists
-            if(line_args[0][0] == '/'):
-                line_args[0] = line_args[0][1:]
-
-            querystring = {'mid': line_args[0].lower()}
-            r = request_get_with_auth(self.url + '/read_module', querystring, self.user, self.password, self.timeout)
-
-            if(r.status_code == 200):
-                resp = r.json()
-                self.module = resp['key']
-                self.get_module_variables()
-                self.prompt = '[' + self.url + ':/' + self.module + ']> '
-            elif(r):
-                self.print_esper_error(r.json())
-        else:
-            print("Please select a module")
-            self.do_list("")
-
-    def complete_write(self, content, line, begidx, endidx):
-        if content:
-            return [
-                variable for variable in self.var_completion
-                if variable.startswith(content)
-            ]
-        else:
-            return self.var_completion
-
-    def do_write(self, line):
-        """Purpose: Write module variable\nUsage: write <vid> <data> [offset] [all]\n"""
-        try:
-            line_args = str.split(line, ' ')
-            if(not line):
-                print("Missing variable to write to\nwrite <vid> <data>")
-                return
-
-            vid = line_args[0].lower()
-            offset = 0
-
-            if((len(line_args) < 2) or (line_args[1] == '')):
-                print("Missing data to write to %s \nwrite %s <data>" % (vid, vid))
-                return
-
-            # If passing an array, there may be spaces between comma separated values, wrecking the initial argument 'split'
-            # Lets fix it up!
-            if(line_args[1][0] == '['):
-                line_args[1] = re.search(r'\[(.*)\]', line).group(1)
-                line_args = line_args[0:2] + str.split(line[str.find(line, ']') + 1:], ' ')[1:]
-
-            # Re-split the payload argument and parse it
-            payload_entities = str.split(line_args[1], ',')
-
-            # Lets make all payloads an array to conform to the obsolete RFC4627... makes later steps easier if everything is array
-            payload = '['
-            for elem in payload_entities:
-                # Clear out white space
-                elem = elem.strip()
-
-                # Booleans are an oddity, lets ensure capitalization doesn't matter for them, convert to JSON spec of all lowercase
-                if((elem.lower() == 'true') or (elem.lower() == 'false')):
-                    elem = elem.lower()
-
-                # Strings need to be changed to use double-quotes to work in JSON as well
-                if(elem[0] == "'"):
-                    elem = "\"" + elem[1:-1] + "\""
-
-                payload = payload + elem.strip() + ','
-
-            payload = payload[0:-1] + ']'
-
-            # Convert payload from JSON to python dict
-            try:
-                payload_dict = json.loads(payload)
-            except:
-                print("Data is not valid JSON")
-                return
-
-            if(len(line_args) > 2):
-                # Offset or 'all' check
-                if(line_args[2].lower() == 'all'):
-                    # Bit of a hack for the moment, reach out and grab the variables total length
-                    querystring = {'mid': self.module, 'vid': vid, 'includeData': 'n'}
-                    r = request_get_with_auth(self.url + '/read_var', querystring, self.user, self.password, self.timeout)
-                    if(r.status_code == 200):
-                        resp = r.json()
-                        if(len(payload_dict) > 1):
-                            print("Data must be single element to use 'all' attribute")
-                            return
-                        else:
-                            # Generate new JSON payload that is an array containing as many elements as the variable can take
-                            old_payload_dict = payload_dict
-                            for n in range(resp['len'] - 1):
-                                payload_dict.append(old_payload_dict[0])
-
-                    else:
-                        print("Error retrieving length of variable")
-                        return
-                else:
-                    offset = int(line_args[2])
-
-            # Convert payload back to JSON back so we send conformal JSON requests
-            payload = json.dumps(payload_dict)
-
-            querystring = {'mid': self.module, 'vid': vid, 'offset': offset}
-            r = request_post_with_auth(self.url + '/write_var', querystring, payload, self.user, self.password, self.timeout)
-
-            if(r.status_code != 200):
-                if(r):
-                    self.print_esper_error(r.json())
-        except:
-            print("Invalid Arguments")
-
-    def complete_wr(self, content, line, begidx, endidx):
-        if content:
-            return [
-                variable for variable in self.var_completion
-                if variable.startswith(content)
-            ]
-        else:
-            return self.var_completion
-
-    def do_wr(self, line):
-        self.do_write(line)
-
-    def complete_ls(self, content, line, begidx, endidx):
-        if content:
-            return [
-                variable for variable in self.var_completion
-                if variable.startswith(content)
-            ]
-        else:
-            return self.var_completion
-
-    def do_ls(self, line):
-        """Purpose: Read module variable(s)\nUsage: ls <vid> [offset] [length] [repeat]\n"""
-        self.do_read(line)
-
-    def do_rd(self, line):
-        """Purpose: Read module variable(s)\nUsage: rd <vid> [offset] [length] [repeat]\n"""
-        self.do_read(line)
-
-    def complete_rd(self, content, line, begidx, endidx):
-        if content:
-            return [
-                variable for variable in self.var_completion
-                if variable.startswith(content)
-            ]
-        else:
-            return self.var_completion
-
-
-    def complete_read(self, content, line, begidx, endidx):
-        if content:
-            return [
-                variable for variable in self.var_completion
-                if variable.startswith(content)
-            ]
-        else:
-            return self.var_completion
-
-    def do_read(self, line):
-        """Purpose: Read module variable(s)\nUsage: read <vid> [offset] [length] [repeat]\n"""
-        try:
-            if(line):
-                start = line.find('[')
-                mid = line.find(':')
-                end = line.find(']')
-
-                # We do this to ensure the str.split() works as expected to break up
-                if(start != -1):
-                    if(line[start - 1] != ' '):
-                        line = line[0:start] + ' ' + line[start:]
-
-                line_args = str.split(line, ' ')
-                vid = line_args[0].lower()
-                offset = 0
-                length = 0
-                repeat = False
-
-                if(len(line_args) > 1):
-                    if((line_args[1].lower() == 'r') or (line_args[1].lower() == 'repeat')):
-                        repeat = True
-                    else:
-                        try:
-                            start = line_args[1].find('[')
-                            mid = line_args[1].find(':')
-                            end = line_args[1].find(']')
-                            if(start != -1):
-                                if(mid != -1):
-                                    offset = int(line_args[1][start + 1:mid])
-                                    length = int(line_args[1][end - 1:mid + 2]) - offset + 1
-                                else:
-                                    offset = int(line_args[1][start + 1:end])
-                                    length = 1
-                            else:
-                                offset = int(line_args[1])
-                        except:
-                            offset = 0
-                            length = 0
-                            repeat = False
-
-                    if(len(line_args) > 2):
-                        if((line_args[2].lower() == 'r') or (line_args[2].lower() == 'repeat')):
-                            repeat = True
-                        else:
-                            length = int(line_args[2])
-
-                    if(len(line_args) > 3):
-                        if((line_args[3].lower() == 'r') or (line_args[3].lower() == 'repeat')):
-                            repeat = True
-                        else:
-                            repeat = False
-
-                try:
-                    done = False
-                    while done is not True:
-                        querystring = {'mid': self.module, 'vid': vid, 'offset': str(offset), 'len': str(length), 'includeData': 'y'}
-                        r = request_get_with_auth(self.url + '/read_var', querystring, self.user, self.password, self.timeout)
-                        if(r.status_code == 200):
-                            resp = r.json()
-                            if(len(resp['d']) > 1):
-                                for n in range(len(resp['d'])):
-                                    print("%s %s" % (str(n).rjust(5), str(resp['d'][n])))
-                            else:
-                                print(str(resp['d'][0]))
-
-                        elif(r):
-                            self.print_esper_error(r.json())
-
-                        if(not repeat):
-                            done = True
-                        else:
-                            time.sleep(1)
-
-                except KeyboardInterrupt:
-                    done = True
-            else:
-                querystring = {'mid': self.module, 'includeVars': 'y', 'includeData': 'n'}
-                r = request_get_with_auth(self.url + '/read_module', querystring, self.user, self.password, self.timeout)
-                if(r.status_code == 200):
-                    mod_resp = r.json()
-                    print('%-5s %-32s %-16s %-8s %-8s %-32s' % ('vid', 'key', 'type', 'options', 'status', 'data'))
-                    print('%-5s %-32s %-16s %-8s %-8s %-32s' % ('---', '---', '----', '-------', '------', '----'))
-                    for i in range(0, len(mod_resp['var'])):
-                        if(mod_resp['var'][i]['type'] != 11):  # limit request length if not a string
-                            querystring = {'mid': self.module, 'vid': mod_resp['var'][i]['id'], 'len': 5, 'includeData': 'y'}
-                        else:
-                            querystring = {'mid': self.module, 'vid': mod_resp['var'][i]['id'], 'includeData': 'y'}
-                        r = request_get_with_auth(self.url + '/read_var', querystring, self.user, self.password, self.timeout)
-                        if(r.status_code == 200):
-                            resp = r.json()
-                            if(not resp['d']):
-                                print('%-5s %-32s %-16s %-8s %-8s %-32s' % (str(resp['id']), resp['key'], Esper().getTypeString(resp['type']), Esper().getOptionString(resp['opt']), Esper().getOptionString(resp['stat']), '%s[%d]' % ('Null', resp['len'])))
-                            elif((len(resp['d']) > 4) and (resp['type'] != 11)):
-                                print('%-5s %-32s %-16s %-8s %-8s %-32s' % (str(resp['id']), resp['key'], Esper().getTypeString(resp['type']), Esper().getOptionString(resp['opt']), Esper().getOptionString(resp['stat']), '%s[%d]' % ('Array', resp['len'])))
-                            elif(resp['type'] == 11):
-                                print('%-5s %-32s %-16s %-8s %-8s %-32s' % (str(resp['id']), resp['key'], Esper().getTypeString(resp['type']), Esper().getOptionString(resp['opt']), Esper().getOptionString(resp['stat']), '"%s"' % str(resp['d'])))
-                            else:
-                                print('%-5s %-32s %-16s %-8s %-8s %-32s' % (str(resp['id']), resp['key'], Esper().getTypeString(resp['type']), Esper().getOptionString(resp['opt']), Esper().getOptionString(resp['stat']), '%s' % str(resp['d'])))
-                elif(r):
-                    self.print_esper_error(r.json())
-
-        except requests.exceptions.RequestException as e:
-            print("Error: {}".format(e))
-
-    def complete_upload(self, content, line, begidx, endidx):
-        if content:
-            return [
-                variable for variable in self.var_completion
-                if variable.startswith(content)
-            ]
-        else:
-            return self.var_completion
-
-    def do_upload(self, line):
-        """Purpose: Upload a binary file to variable\nUsage: upload <vid> <file>"""
-        try:
-            if(line):
-                line_args = str.split(line, ' ')
-
-                if(len(line_args) < 1):
-                    print("Missing [vid] and [file]")
-                    return
-
-                if(len(line_args) < 2):
-                    print("Missing [file]")
-                    return
-
-                vid = line_args[0].lower()
-
-                try:
-                    upload_file = open(line_args[1], 'rb')
-                except:
-                    print("Error opening file for reading")
-                    return
-            else:
-                print("Missing arugments")
-                return
-
-            querystring = {'mid': self.module, 'vid': vid}
-            r = request_get_with_auth(self.url + '/read_var', querystring, self.user, self.password, self.timeout)
-            if(r.status_code == 200):
-                # Var found, lets see what we got!
-                vinfo = r.json()
-                # Always use the 'max_req_size', otherwise certain flash devices like EPCQs may have issue with multiple chunks to the same block..
-                chunk_size = vinfo['max_req_size']
-                # Get the size of the file and then return to the start
-                upload_file.seek(0, os.SEEK_END)
-                file_size = upload_file.tell()
-                upload_file.seek(0, os.SEEK_SET)
-
-                # print('Chunk size: ' + str(chunk_size))
-                # print('File size: ' + str(file_size))
-                print("Uploading [%-50s]" % (" "), end="")
-
-                # Get the first chunk of the file
-                payload = upload_file.read(chunk_size)
-                chunk_size = len(payload)
-                file_offset = 0
-                retry_count = 0
-                max_retries = 3
-                while(chunk_size > 0):
-                    sys.stdout.flush()
-                    # transmit payload using binary methods
-                    querystring = {'mid': self.module, 'vid': vid, 'offset': file_offset, 'len': chunk_size, 'binary': 'y'}
-                    r = request_post_with_auth(self.url + '/write_var', querystring, payload, self.user, self.password, self.timeout)
-
-                    # Did we transfer successfully?
-                    if(r.status_code == 200):
-                        # update offset to write to, based on last chunk_size written
-                        file_offset += chunk_size
-                        # Grab the next binary chunk
-                        payload = upload_file.read(chunk_size)
-                        # update chunk_size to match what was actually grabbed (may be less if chunk_size was less than remaining length)
-                        chunk_size = len(payload)
-                        strCompleteness = '#' * int(file_offset / float(file_size) * 50)
-                        print("\rUploading [%-50s]" % (strCompleteness), end="")
-                    # Retry up to X times
-                    elif(retry_count < max_retries):
-                        retry_count += 1
-                        print("\nUpload attempt failed, retrying...")
-                    else:
-                        print("Failed to upload " + os.path.basename(upload_file.name))
-
-                print("\nDone uploading " + os.path.basename(upload_file.name))
-
-            elif(r):
-                self.print_esper_error(r.json())
-
-        except:
-            print("Unknown error uploading file")
-
-    def complete_download(self, content, line, begidx, endidx):
-        if content:
-            return [
-                variable for variable in self.var_completion
-                if variable.startswith(content)
-            ]
-        else:
-            return self.var_completion
-
-    def do_download(self, line):
-        """Purpose: Download a variable to a binary file\nUsage: download <vid> <file>"""
-        # Keys should always be lower case
-        try:
-            if(line):
-                line_args = str.split(line, ' ')
-
-                if(len(line_args) < 1):
-                    print("Missing <vid> and <file>")
-                    return
-
-                if(len(line_args) < 2):
-                    print("Missing <file>")
-                    return
-
-                vid = line_args[0].lower()
-
-                try:
-                    download_file = open(line_args[1], 'wb')
-                except:
-                    print("Error opening file for writing")
-                    return
-            else:
-                print("Missing arugments")
-                return
-
-            querystring = {'mid': self.module, 'vid': vid}
-            r = request_get_with_auth(self.url + '/read_var', querystring, self.user, self.password, self.timeout)
-
-            if(r.status_code == 200):
-                # Var found, lets see what we got!
-                vinfo = r.json()
-                # Always use the 'max_req_size', otherwise certain flash devices like EPCQs may have issue with multiple chunks to the same block..
-                chunk_size = vinfo['max_req_size']
-                # Get the size of the file and then return to the start
-                file_size = vinfo['len']
-
-                # print('Chunk size: ' + str(chunk_size))
-                # print('File size: ' + str(file_size))
-                print("Downloading [%-50s]" % (" "), end="")
-
-                # Get the first chunk of the file
-                file_offset = 0
-                retry_count = 0
-                max_retries = 3
-                while(file_offset < file_size):
-                    sys.stdout.flush()
-
-                    if(chunk_size > (file_size - file_offset)):
-                        chunk_size = file_size - file_offset
-
-                    # transmit payload using binary methods
-                    querystring = {'mid': self.module, 'vid': vid, 'offset': file_offset, 'len': chunk_size, 'binary': 'y', 'dataOnly': 'y'}
-                    r = request_get_with_auth(self.url + '/read_var', querystring, self.user, self.password, self.timeout)
-
-                    # Did we transfer successfully?
-                    if(r.status_code == 200):
-                        # update offset to write to, based on last chunk_size written
-                        file_offset += len(r.content)
-
-                        # Grab the next binary chunk
-                        download_file.write(r.content)
-
-                        strCompleteness = '#' * int(file_offset / float(file_size) * 50)
-                        print("\rDownloading [%-50s]" % (strCompleteness), end="")
-
-                    # Retry up to X times
-                    elif(retry_count < max_retries):
-                        retry_count += 1
-                        print("\nDownload attempt failed, retrying...")
-                    else:
-                        print("Failed to download " + os.path.basename(download_file.name))
-
-                print("\nDone download to " + os.path.basename(download_file.name))
-
-            elif(r):
-                self.print_esper_error(r.json())
-        except:
-            print("Unknown error downloading file")
-
-    def do_exit(self, line):
-        """Purpose: Quit esper-tool\nUsage: exit\n"""
-        return True
-
-    def do_quit(self, line):
-        """Purpose: Quit esper-tool\nUsage: quit\n"""
-        return True
-
-
 def main():
     try:
         prog = 'esper-tool'
@@ -743,6 +68,10 @@ def main():
         # Verbose, because sometimes you want feedback
         parser.add_argument('-v','--verbose', help="Verbose output", default=False, action='store_true')
         parser.add_argument('--version', action='version', version='%(prog)s ' + version)
+        parser.add_argument('--cache', default=None, help="File to keep module/variable metadata in between runs")
+        parser.add_argument('--cache-ttl', default=DEFAULT_TTL, help="Seconds cached metadata is trusted for")
+        parser.add_argument('--socket', default=None, help="Unix socket of the esper-tool daemon, defaults to $ESPER_TOOL_SOCKET or esper-tool.sock in the user's runtime directory")
+        parser.add_argument('--no-daemon', default=False, action='store_true', help="Talk to the node directly even if a daemon is running")
 
         # Sub parser for write,read
         subparsers = parser.add_subparsers(title='commands', dest='command', description='Available Commands', help='Type ' + prog + ' [command] -h to see additional options')
@@ -754,52 +83,98 @@ def main():
         parser_interactive.add_argument("-u", "--user", default=False, help="User for Auth")
         parser_interactive.add_argument("-p", "--password", default=False, help="Password for Auth")
         parser_interactive.add_argument("-t", "--timeout", default=5, help="Request Timeout in Seconds")
+        parser_interactive.add_argument("--pool", default=DEFAULT_POOL_SIZE, help="Maximum pooled HTTP connections to node")
+        parser_interactive.add_argument("-w", "--window", default=1, help="Transfer chunks kept in flight, 1 for strictly sequential (flash) writes")
 
         # Write arguments
         parser_write = subparsers.add_parser('write', help='[-o <offset>] [-d <json value/array>]  <url> <mid> <vid>')
         parser_write.add_argument('-d', '--data', help="JSON data to write")
-        parser_write.add_argument('-f', '--file', type=argparse.FileType('r'), help="JSON file to write from")
+        parser_write.add_argument('-f', '--file', help="File to write from, a JSON value or array, or an array as .npy or .csv/.txt")
         parser_write.add_argument('-o', '--offset', default='0',dest='offset', help='offset to write to')
+        parser_write.add_argument('--binary', default=False, action='store_true', help="Write arrays as binary chunks of the variable's type instead of JSON")
+        parser_write.add_argument('-w', '--window', default=1, help="Chunks of large arrays kept in flight, 1 for strictly sequential (flash) writes")
+        parser_write.add_argument('-r', '--retry', default='3', help='number of retries to attempt per chunk of large arrays')
         parser_write.add_argument("-u", "--user", default=False, help="User for Auth")
         parser_write.add_argument("-p", "--password", default=False, help="Password for Auth")
         parser_write.add_argument("-t", "--timeout", default=5, help="Request Timeout in Seconds")
+        parser_write.add_argument("--pool", default=DEFAULT_POOL_SIZE, help="Maximum pooled HTTP connections to node")
         parser_write.add_argument("url", help="Node URL. ie: 'http://<hostname>:<port>'")
         parser_write.add_argument("mid", help="Module Id or Key")
         parser_write.add_argument("vid", help="Variable Id or Key")
 
         # Read arguments
-        parser_read = subparsers.add_parser('read', help='[-o <offset>] [-l <length>] <url> <mid> <vid>')
+        parser_read = subparsers.add_parser('read', help='[-o <offset>] [-l <length>] <url> <mid> <vid> | <url> <mid/vid> [<mid/vid> ...]')
         parser_read.add_argument('-o', '--offset', default='0', help='element offset to read from')
         parser_read.add_argument('-l', '--len', default='0', help='elements to read')
+        parser_read.add_argument('--binary', default=False, action='store_true', help="Read data in binary chunks and decode it using the variable's type")
+        parser_read.add_argument('--format', default='npy', choices=BINARY_FORMATS, help="Format binary reads are written in")
+        parser_read.add_argument('-f', '--file', help="File to write binary reads to, csv defaults to stdout")
+        parser_read.add_argument('-w', '--window', default=1, help="Binary chunks fetched concurrently")
+        parser_read.add_argument('-r', '--retry', default='3', help='number of retries to attempt per binary chunk')
         parser_read.add_argument("-u", "--user", default=False, help="User for Auth")
         parser_read.add_argument("-p", "--password", default=False, help="Password for Auth")
         parser_read.add_argument("-t", "--timeout", default=5, help="Request Timeout in Seconds")
+        parser_read.add_argument("--pool", default=DEFAULT_POOL_SIZE, help="Maximum pooled HTTP connections to node")
         parser_read.add_argument("url", help="Node URL. ie: 'http://<hostname>:<port>'")
-        parser_read.add_argument("mid", help="Module Id or Key")
-        parser_read.add_argument("vid", help="Variable Id or Key")
+        parser_read.add_argument("vars", nargs='+', help="Module and Variable Id or Key (<mid> <vid>), or any number of mid/vid[offset:len], where * and ? match keys (ie: 'adc/ch*')")
 
         # Upload arguments
         parser_upload = subparsers.add_parser('upload', help='[-f <file>] <url> <mid> <vid>')
         parser_upload.add_argument('-f', '--file', required='true', type=argparse.FileType('rb'), help="binary file to upload")
         parser_upload.add_argument('-r', '--retry', default='3', help='number of retries to attempt')
+        parser_upload.add_argument("-w", "--window", default=1, help="Chunks kept in flight, 1 for strictly sequential (flash) writes")
+        parser_upload.add_argument("--diff", default=False, action='store_true', help="Read back each chunk first and only write chunks that differ")
+        parser_upload.add_argument("--resume", default=False, action='store_true', help="Journal written chunks to FILE.journal and skip those already written by a failed run")
         parser_upload.add_argument("-u", "--user", default=False, help="User for Auth")
         parser_upload.add_argument("-p", "--password", default=False, help="Password for Auth")
         parser_upload.add_argument("-t", "--timeout", default=5, help="Request Timeout in Seconds")
+        parser_upload.add_argument("--pool", default=DEFAULT_POOL_SIZE, help="Maximum pooled HTTP connections to node")
         parser_upload.add_argument("url", help="Node URL. ie: 'http://<hostname>:<port>'")
         parser_upload.add_argument("mid", help="Module Id or Key")
         parser_upload.add_argument("vid", help="Variable Id or Key")
 
         # Download arguments
         parser_download = subparsers.add_parser('download', help='[-f <file>] <url> <mid> <vid>')
-        parser_download.add_argument('-f', '--file', required='true', type=argparse.FileType('wb'), help="binary file to download to")
+        parser_download.add_argument('-f', '--file', required='true', help="binary file to download to")
         parser_download.add_argument('-r', '--retry', default='3', help='number of retries to attempt')
+        parser_download.add_argument("-w", "--window", default=1, help="Chunks fetched concurrently")
+        parser_download.add_argument("--resume", default=False, action='store_true', help="Journal fetched chunks to FILE.journal and skip those already fetched by a failed run")
         parser_download.add_argument("-u", "--user", default=False, help="User for Auth")
         parser_download.add_argument("-p", "--password", default=False, help="Password for Auth")
         parser_download.add_argument("-t", "--timeout", default=5, help="Request Timeout in Seconds")
+        parser_download.add_argument("--pool", default=DEFAULT_POOL_SIZE, help="Maximum pooled HTTP connections to node")
         parser_download.add_argument("url", help="Node URL. ie: 'http://<hostname>:<port>'")
         parser_download.add_argument("mid", help="Module Id or Key")
         parser_download.add_argument("vid", help="Variable Id or Key")
 
+        # Watch arguments
+        parser_watch = subparsers.add_parser('watch', help='[-r <rate>] <url> <mid/vid> [<mid/vid> ...]')
+        parser_watch.add_argument('-r', '--rate', default=1, help="Samples per second")
+        parser_watch.add_argument('-n', '--count', default=0, help="Number of samples to take, 0 for no limit")
+        parser_watch.add_argument('-d', '--duration', default=0, help="Seconds to sample for, 0 for no limit")
+        parser_watch.add_argument('--format', default='text', choices=WATCH_FORMATS, help="Output format")
+        parser_watch.add_argument('-c', '--changes', default=False, action='store_true', help="Only poll write count/timestamp, and fetch and output data only when it changes")
+        parser_watch.add_argument('-f', '--file', default='-', type=argparse.FileType('wt'), help="File to write samples to, defaults to stdout")
+        parser_watch.add_argument("-u", "--user", default=False, help="User for Auth")
+        parser_watch.add_argument("-p", "--password", default=False, help="Password for Auth")
+        parser_watch.add_argument("-t", "--timeout", default=5, help="Request Timeout in Seconds")
+        parser_watch.add_argument("--pool", default=DEFAULT_POOL_SIZE, help="Maximum pooled HTTP connections to node")
+        parser_watch.add_argument("url", help="Node URL. ie: 'http://<hostname>:<port>'")
+        parser_watch.add_argument("vars", nargs='+', help="Variables to sample, as mid/vid or mid/vid[offset:len]")
+
+        parser_record = subparsers.add_parser('record', help='[-r <rate>] [-d <seconds>] -f <file> <url> <mid/vid> [<mid/vid> ...]')
+        parser_record.add_argument('-r', '--rate', default=1, help="Samples per second")
+        parser_record.add_argument('-n', '--count', default=0, help="Number of samples to take, 0 for no limit")
+        parser_record.add_argument('-d', '--duration', default=0, help="Seconds to record for, 0 for no limit")
+        parser_record.add_argument('--chunk', default=None, help="Samples per compressed chunk written to the file, defaults to 1000")
+        parser_record.add_argument('-f', '--file', required=True, help="Recording file to write")
+        parser_record.add_argument("-u", "--user", default=False, help="User for Auth")
+        parser_record.add_argument("-p", "--password", default=False, help="Password for Auth")
+        parser_record.add_argument("-t", "--timeout", default=5, help="Request Timeout in Seconds")
+        parser_record.add_argument("--pool", default=DEFAULT_POOL_SIZE, help="Maximum pooled HTTP connections to node")
+        parser_record.add_argument("url", help="Node URL. ie: 'http://<hostname>:<port>'")
+        parser_record.add_argument("vars", nargs='+', help="Variables to record, as mid/vid or mid/vid[offset:len]")
+
         # Discovery arguments
         parser_discover = subparsers.add_parser('discover', help='')
         parser_discover.add_argument("-t", "--timeout", default=2, help="Request Timeout in Seconds")
@@ -810,57 +185,137 @@ def main():
         parser_discover.add_argument("--rev", default="", help="Device revision to search for")
         parser_discover.add_argument("--id", default=None, help="Device id to search for")
         parser_discover.add_argument("--hwid", default="", help="Hardware id to search for")
+        parser_discover.add_argument("--rounds", default=3, help="Number of times to send the discovery request, in case packets are lost")
+        parser_discover.add_argument("-n", "--count", default=0, help="Stop as soon as this many devices have answered, 0 to wait for the timeout")
+        parser_discover.add_argument("--target", action='append', default=None, help="Subnet (ie: 10.1.0.0/16) or address to send discovery to, may be repeated. Defaults to every local interface")
 
         # Config arguments
         parser_get_config = subparsers.add_parser('get-config', help='Read configuration from device')
         parser_get_config.add_argument('-f', '--file', required='true', type=argparse.FileType('wt'), help="Location to store config")
         parser_get_config.add_argument('-r', '--retry', default='3', help='number of retries to attempt')
+        parser_get_config.add_argument('-j', '--jobs', default=4, help='number of modules to read concurrently')
         parser_get_config.add_argument("-u", "--user", default=False, help="User for Auth")
         parser_get_config.add_argument("-p", "--password", default=False, help="Password for Auth")
         parser_get_config.add_argument("-t", "--timeout", default=5, help="Request Timeout in Seconds")
+        parser_get_config.add_argument("--pool", default=DEFAULT_POOL_SIZE, help="Maximum pooled HTTP connections to node")
         parser_get_config.add_argument("url", help="Node URL. ie: 'http://<hostname>:<port>'")
 
         parser_set_config = subparsers.add_parser('set-config', help='Write configuration to device')
         parser_set_config.add_argument('-f', '--file', required='true', type=argparse.FileType('rt'), help="Location to read config")
         parser_set_config.add_argument('-r', '--retry', default='3', help='number of retries to attempt')
+        parser_set_config.add_argument('-j', '--jobs', default=4, help='number of modules to read and variables to write concurrently')
+        parser_set_config.add_argument('--rtol', default=0, help='relative tolerance when comparing float32/float64 variables')
+        parser_set_config.add_argument('--atol', default=0, help='absolute tolerance when comparing float32/float64 variables')
+        parser_set_config.add_argument('--ordered', default=False, action='store_true', help='write the variables of each module one at a time, in file order')
         parser_set_config.add_argument("-u", "--user", default=False, help="User for Auth")
         parser_set_config.add_argument("-p", "--password", default=False, help="Password for Auth")
         parser_set_config.add_argument("-t", "--timeout", default=5, help="Request Timeout in Seconds")
+        parser_set_config.add_argument("--pool", default=DEFAULT_POOL_SIZE, help="Maximum pooled HTTP connections to node")
         parser_set_config.add_argument("url", help="Node URL. ie: 'http://<hostname>:<port>'")
 
         parser_diff = subparsers.add_parser('diff', help='Compare configuration from file to device')
         parser_diff.add_argument('-f', '--file', required='true', type=argparse.FileType('rt'), help="Location to read config")
         parser_diff.add_argument('-d', '--delta', type=argparse.FileType('wt'), help="Location to write delta")
         parser_diff.add_argument('-r', '--retry', default='3', help='number of retries to attempt')
+        parser_diff.add_argument('-j', '--jobs', default=4, help='number of modules to read concurrently')
+        parser_diff.add_argument('--rtol', default=0, help='relative tolerance when comparing float32/float64 variables')
+        parser_diff.add_argument('--atol', default=0, help='absolute tolerance when comparing float32/float64 variables')
         parser_diff.add_argument("-u", "--user", default=False, help="User for Auth")
         parser_diff.add_argument("-p", "--password", default=False, help="Password for Auth")
         parser_diff.add_argument("-t", "--timeout", default=5, help="Request Timeout in Seconds")
+        parser_diff.add_argument("--pool", default=DEFAULT_POOL_SIZE, help="Maximum pooled HTTP connections to node")
         parser_diff.add_argument("url", help="Node URL. ie: 'http://<hostname>:<port>'")
 
+        parser_fleet = subparsers.add_parser('fleet', help='Run get-config, diff or set-config against many nodes at once')
+        parser_fleet.add_argument("action", choices=FLEET_ACTIONS, help="Operation to run on every node")
+        parser_fleet.add_argument("urls", nargs='*', help="Node URLs. ie: 'http://<hostname>:<port>'")
+        parser_fleet.add_argument('-f', '--file', type=argparse.FileType('rt'), help="Config to compare against (diff) or write (set-config)")
+        parser_fleet.add_argument('-o', '--output', default='-', type=argparse.FileType('wt'), help="Location to write consolidated JSON result, defaults to stdout")
+        parser_fleet.add_argument('--urls-file', type=argparse.FileType('rt'), help="File listing node URLs, one per line")
+        parser_fleet.add_argument('--discover', default=False, action='store_true', help="Include nodes found by UDP discovery")
+        parser_fleet.add_argument('--discover-timeout', default=2, help="Time to wait for discovery responses in Seconds")
+        parser_fleet.add_argument('-n', '--nodes', default=16, help='number of nodes to run concurrently')
+        parser_fleet.add_argument('--node-timeout', default=60, help='Seconds allowed for each node to finish')
+        parser_fleet.add_argument('-j', '--jobs', default=4, help='number of modules to read and variables to write concurrently on each node')
+        parser_fleet.add_argument('--rtol', default=0, help='relative tolerance when comparing float32/float64 variables')
+        parser_fleet.add_argument('--atol', default=0, help='absolute tolerance when comparing float32/float64 variables')
+        parser_fleet.add_argument('--ordered', default=False, action='store_true', help='set-config writes the variables of each module one at a time, in file order')
+        parser_fleet.add_argument("-u", "--user", default=False, help="User for Auth")
+        parser_fleet.add_argument("-p", "--password", default=False, help="Password for Auth")
+        parser_fleet.add_argument("-t", "--timeout", default=5, help="Request Timeout in Seconds")
+        parser_fleet.add_argument("--pool", default=DEFAULT_POOL_SIZE, help="Maximum pooled HTTP connections to each node")
+
+        parser_batch = subparsers.add_parser('batch', help='[-f <script>] [-j <jobs>] <url>')
+        parser_batch.add_argument('-f', '--file', default='-', type=argparse.FileType('rt'), help="Script of read/write/upload operations, defaults to stdin")
+        parser_batch.add_argument('-o', '--output', default='-', type=argparse.FileType('wt'), help="File to write one JSON result per operation to, defaults to stdout")
+        parser_batch.add_argument('-j', '--jobs', default=4, help="Operations run concurrently between barriers")
+        parser_batch.add_argument('-w', '--window', default=1, help="Upload chunks kept in flight, 1 for strictly sequential (flash) writes")
+        parser_batch.add_argument('-r', '--retry', default='3', help='number of retries to attempt per upload chunk')
+        parser_batch.add_argument('-x', '--stop-on-error', default=False, action='store_true', help="Skip everything after the next barrier once an operation fails")
+        parser_batch.add_argument("-u", "--user", default=False, help="User for Auth")
+        parser_batch.add_argument("-p", "--password", default=False, help="Password for Auth")
+        parser_batch.add_argument("-t", "--timeout", default=5, help="Request Timeout in Seconds")
+        parser_batch.add_argument("--pool", default=DEFAULT_POOL_SIZE, help="Maximum pooled HTTP connections to node")
+        parser_batch.add_argument("url", help="Node URL. ie: 'http://<hostname>:<port>'")
+
+        parser_daemon = subparsers.add_parser('daemon', help='Keep node connections and metadata warm for other esper-tool commands')
+        parser_daemon.add_argument('--detach', default=False, action='store_true', help="Run in the background, returns once the daemon is accepting commands")
+        parser_daemon.add_argument('--stop', default=False, action='store_true', help="Stop the running daemon")
+        parser_daemon.add_argument('--status', default=False, action='store_true', help="Show whether a daemon is running and what it is connected to")
+
         # Put the arguments passed into args
         parser.set_default_subparser('interactive')
-        args = parser.parse_args()
+        args, extra_args = parser.parse_known_args()
+        # argparse hands fleet node URLs given after options (ie: fleet diff -f cfg.json node1 node2) back unparsed
+        if(extra_args):
+            if((args.command == 'fleet') and not any(arg.startswith('-') for arg in extra_args)):
+                args.urls += extra_args
+            else:
+                parser.error('unrecognized arguments: ' + ' '.join(extra_args))
+        # A rate of 0 would never sample
+        if(args.command in ('watch', 'record')):
+            try:
+                args.rate = parse_rate(args.rate)
+            except ValueError as e:
+                parser.error(str(e))
         try:
 
-            args.timeout = float(args.timeout)
+            # daemon is the only command without a request timeout
+            if(args.command != 'daemon'):
+                args.timeout = float(args.timeout)
 
-            # Strip trailing / off args.url
-            if(args.url[-1:] == '/'):
-                args.url = args.url[0:-1]
-
-            # if url is missing 'http', add it
-            if((args.url[0:7] != 'http://') and (args.url[0:8] != 'https://')):
-                args.url = 'http://' + args.url
-
-            if(args.user):
+            if(getattr(args, 'user', False)):
                 if(not args.password):
+                    import getpass
                     args.password = getpass.getpass("Insert your password: ")
 
+            # Module/variable descriptors, so repeated lookups skip the round trip
+            metadata = MetadataCache(float(args.cache_ttl), args.cache)
+
+            # discover, fleet and daemon are the only commands not aimed at a single node
+            if(args.command not in ('discover', 'fleet', 'daemon')):
+                args.url = normalize_url(args.url)
+
+                # A running daemon already holds a warm connection and the metadata for the node
+                client = None
+                if(not args.no_daemon):
+                    from . import daemon
+
+                    client = daemon.connect(args.socket or daemon.default_socket_path(), args.url, args.user, args.password, args.timeout, args.pool)
+                    if(client is not None):
+                        metadata = daemon.DaemonMetadata(client)
+
+                # Otherwise one pooled, keep-alive client is shared by everything talking to this node
+                if(client is None):
+                    client = EsperClient(args.url, args.user, args.password, args.timeout, args.pool)
+
             if(args.command == 'interactive'):
+                import requests
+                from .interactive import InteractiveMode
 
                 # Attempt to connect to verify the ESPER service is reachable
                 querystring = {'mid': 'system'}
-                r = request_get_with_auth(args.url + '/read_module', querystring, args.user, args.password, args.timeout)
+                r = client.get('/read_module', querystring)
                 if(r.status_code == 200):
                     try:
                         resp = r.json()
@@ -885,13 +340,14 @@ def main():
                 interactive = InteractiveMode()
                 interactive.url = args.url
                 interactive.prog = prog
-                interactive.user = args.user
-                interactive.timeout = args.timeout
-                interactive.password = args.password
+                interactive.client = client
+                interactive.metadata = metadata
+                interactive.window = max(1, int(args.window))
+                interactive.rate = 1.0
 
                 try:
                     querystring = {'mid': 'system', 'vid': 'device', 'dataOnly': 'y'}
-                    r = request_get_with_auth(args.url + '/read_var', querystring, args.user, args.password, args.timeout)
+                    r = client.get('/read_var', querystring)
                     if(r.status_code == 200):
                         interactive.host = r.json()
                     else:
@@ -899,20 +355,13 @@ def main():
                         print('\tStatus: ' + str(err['error']['status']) + '\n\tCode: ' + str(err['error']['code']) + '\n\tMeaning: ' + err['error']['meaning'] + '\n\tMessage: ' + err['error']['message'] + '\n')
                         sys.exit(1)
 
-                    querystring = {'mid': args.mid}
-                    r = request_get_with_auth(args.url + '/read_module', querystring, args.user, args.password, args.timeout)
-
-                    if(r.status_code == 200):
-                        interactive.module = r.json()['key']
-                    else:
-                        querystring = {'mid': 'system'}
-                        r = request_get_with_auth(args.url + '/read_module', querystring, args.user, args.password, args.timeout)
-
-                        if(r.status_code == 200):
-                            interactive.module = r.json()['key']
-                        else:
-                            err = r.json()
-                            print('\tStatus: ' + str(err['error']['status']) + '\n\tCode: ' + str(err['error']['code']) + '\n\tMeaning: ' + err['error']['meaning'] + '\n\tMessage: ' + err['error']['message'] + '\n')
+                    try:
+                        interactive.module = metadata.module(client, args.mid)['key']
+                    except EsperError:
+                        try:
+                            interactive.module = metadata.module(client, 'system')['key']
+                        except EsperError as e:
+                            print(e)
                             sys.exit(1)
 
                     interactive.intro = "Connected to " + interactive.host + "@" + args.url + "\nType 'help' for a list of available commands"
@@ -929,6 +378,8 @@ def main():
 
             # Handle write
             elif(args.command == 'write'):
+                from . import binary
+
                 # Keys should always be lower case
                 args.mid = args.mid.lower()
                 args.vid = args.vid.lower()
@@ -936,43 +387,72 @@ def main():
 
                 # if -d is set, we will write what is passed on the command line
                 # ESPER is expecting either a JSON array [], a JSON string " ", or a single JSON primitive
+                payload = None
                 if args.data is not None:
                     payload = args.data
 
-                    if(payload[0] == '['):
-                        # booleans are an oddity, lets ensure capitalization doesn't matter for them, convert to JSON spec of all lowercase
-                        payload_entities = str.split(payload[1:-1], ',')
-
-                        # Lets make all payloads an array to conform to the obsolete RFC4627... makes later steps easier if everything is array
-                        payload = '['
-                        for elem in payload_entities:
-                            # Clear out white space
-                            elem = elem.strip()
-
-                            # Booleans are an oddity, lets ensure capitalization doesn't matter for them, convert to JSON spec of all lowercase
-                            if((elem.lower() == 'true') or (elem.lower() == 'false')):
-                                elem = elem.lower()
-
-                            # Strings need to be changed to use double-quotes to work in JSON as well
-                            if(elem[0] == "'"):
-                                elem = "\"" + elem[1:-1] + "\""
+                    if(payload[:1] == '['):
+                        # Arrays may use any capitalization of true/false and 'single quoted' strings, make them JSON
+                        payload = binary.lenient_json(payload)
 
-                            payload = payload + elem.strip() + ','
-
-                        payload = payload[0:-1] + ']'
-
-                # if -f is set, we will write in file that contains JSON in the above format
+                # if -f is set, we will write in file that contains JSON in the above format, or a typed array
                 elif args.file is not None:
-                    with args.file as upload_file:
-                        payload = upload_file.read()
+                    if(os.path.splitext(args.file)[1].lower() not in binary.ARRAY_FILE_TYPES):
+                        try:
+                            with open(args.file, 'r') as upload_file:
+                                payload = upload_file.read()
+                        except (IOError, OSError) as e:
+                            print("Unable to read " + args.file + ": " + str(e))
+                            sys.exit(1)
                 else:
                     # No data specified to send on write, just bail out. Argparser should ensure this branch never gets reached
                     print("No data specified to send, exiting\n")
                     # It didn't fail, so return 0
                     sys.exit(0)
 
+                # Large arrays, typed files and binary writes are parsed into an array and
+                # sent in max_req_size chunks, so need the variable's type and limits first
+                vinfo = None
+                if(args.binary or (payload is None) or ((payload.lstrip()[:1] == '[') and (len(payload) > binary.SINGLE_WRITE_LIMIT))):
+                    try:
+                        vinfo = metadata.variable(client, args.mid, args.vid)
+                        mid, vid = metadata.resolve(client, args.mid, args.vid)
+                    except EsperError as e:
+                        if(args.verbose):
+                            print(e)
+                        sys.exit(1)
+
+                    # Still fits in one request
+                    if((not args.binary) and (payload is not None) and (len(payload) <= vinfo['max_req_size'])):
+                        vinfo = None
+
+                if(vinfo is not None):
+                    from . import transfer
+
+                    try:
+                        if(payload is None):
+                            array = binary.load_array(args.file, vinfo['type'])
+                        else:
+                            array = binary.parse_array(payload, vinfo['type'])
+                    except (ValueError, OverflowError, IOError, OSError) as e:
+                        print("Unable to parse array to write: " + str(e))
+                        sys.exit(1)
+
+                    if(args.verbose):
+                        print("Writing [%-50s]" % (" "), end="")
+
+                    try:
+                        requests_made = binary.write_array(client, mid, vid, vinfo, array, int(args.offset), args.binary, int(args.window), int(args.retry), transfer.progress_bar("Writing") if args.verbose else None)
+                    except (ValueError, transfer.TransferError) as e:
+                        print(("\n" if args.verbose else "") + "Failed to write " + args.mid + "/" + args.vid + ": " + str(e))
+                        sys.exit(1)
+
+                    if(args.verbose):
+                        print("\nWrote %d element(s) in %d request(s)" % (len(array), requests_made))
+                    sys.exit(0)
+
                 # Send POST request
-                r = request_post_with_auth(args.url + '/write_var', querystring, payload, args.user, args.password, args.timeout)
+                r = client.post('/write_var', querystring, payload)
                 if(r.status_code == 200):
                     if(args.verbose):
                         err = r.json()
@@ -986,12 +466,69 @@ def main():
                     sys.exit(1)
             # Handle read
             elif(args.command == 'read'):
+                # 'read <url> <mid> <vid>' reads one variable and prints exactly what the node returned
+                if((len(args.vars) == 2) and not any(('/' in var) for var in args.vars)):
+                    args.mid, args.vid = args.vars
+                else:
+                    from .multiread import read_var_specs, is_pattern, format_document
+
+                    try:
+                        specs = [parse_var_spec(var) for var in args.vars]
+                    except ValueError as e:
+                        print(e)
+                        sys.exit(1)
+
+                    if(args.binary):
+                        if((len(specs) != 1) or is_pattern(specs[0].mid) or is_pattern(specs[0].vid)):
+                            print("--binary reads a single variable")
+                            sys.exit(1)
+                        args.mid, args.vid, args.offset, args.len = specs[0]
+
+                    else:
+                        # Everything in one JSON document, {name: data}
+                        try:
+                            data, errors = read_var_specs(client, metadata, specs)
+                        except (ValueError, EsperError) as e:
+                            print(e)
+                            sys.exit(1)
+
+                        print(format_document(data))
+                        if(args.verbose):
+                            for name in errors:
+                                print(name + ": " + errors[name], file=sys.stderr)
+                        sys.exit(1 if errors else 0)
+
                 # Keys should always be lower case
                 args.mid = args.mid.lower()
                 args.vid = args.vid.lower()
+
+                if(args.binary):
+                    from . import binary
+                    from . import transfer
+
+                    if((args.format != 'csv') and (not args.file)):
+                        print("A file (-f) is needed to write " + args.format + " data to")
+                        sys.exit(1)
+
+                    # Need the type, length and max chunk size of the variable first
+                    try:
+                        vinfo = metadata.variable(client, args.mid, args.vid)
+                        mid, vid = metadata.resolve(client, args.mid, args.vid)
+                    except EsperError as e:
+                        if(args.verbose):
+                            print(e)
+                        sys.exit(1)
+
+                    try:
+                        binary.read_array(client, mid, vid, vinfo, int(args.offset), int(args.len), int(args.window), int(args.retry), args.format, args.file)
+                    except transfer.TransferError as e:
+                        print("Failed to read " + args.mid + "/" + args.vid + ": " + str(e))
+                        sys.exit(1)
+                    sys.exit(0)
+
                 querystring = {'mid': args.mid, 'vid': args.vid, 'offset': args.offset, 'len': args.len, 'dataOnly': 'y'}
                 # Send GET request
-                r = request_get_with_auth(args.url + '/read_var', querystring, args.user, args.password, args.timeout)
+                r = client.get('/read_var', querystring)
 
                 if(r.status_code == 200):
                     print(r.content)
@@ -1003,126 +540,131 @@ def main():
                     sys.exit(1)
             # Handle file uploading
             elif(args.command == 'upload'):
+                from . import transfer
+                from . import binary
+
                 # Keys should always be lower case
                 args.mid = args.mid.lower()
                 args.vid = args.vid.lower()
                 # Get var info first, need to know max chunk size of file to send
                 with args.file as upload_file:
-                    querystring = {'mid': args.mid, 'vid': args.vid}
-                    r = request_get_with_auth(args.url + '/read_var', querystring, args.user, args.password, args.timeout)
-                    if(r.status_code == 200):
-                        # Var found, lets see what we got!
-                        vinfo = r.json()
+                    try:
+                        vinfo = metadata.variable(client, args.mid, args.vid)
+                        # Chunks go by numeric id, the node then needn't look the keys up each time
+                        mid, vid = metadata.resolve(client, args.mid, args.vid)
+                    except EsperError as e:
+                        vinfo = None
+                        if(args.verbose):
+                            print(e)
+
+                    if(vinfo is not None):
                         # Always use the 'max_req_size', otherwise certain flash devices like EPCQs may have issue with multiple chunks to the same block..
                         chunk_size = vinfo['max_req_size']
-                        # Get the size of the file and then return to the start
-                        upload_file.seek(0, os.SEEK_END)
-                        file_size = upload_file.tell()
-                        upload_file.seek(0, os.SEEK_SET)
+                        element_size = binary.esper_dtype(vinfo['type']).itemsize
+
+                        journal = None
+                        if(args.resume):
+                            # Skip chunks a previous failed run already wrote
+                            journal = transfer.TransferJournal(upload_file.name + '.journal', 'upload', args.mid, args.vid, os.fstat(upload_file.fileno()).st_size, chunk_size)
+                            if(journal.load() and args.verbose):
+                                print("Resuming upload, %d chunk(s) already written" % len(journal.completed))
+                            journal.open()
 
                         if(args.verbose):
                             print("Uploading [%-50s]" % (" "), end="")
 
-                        # Get the first chunk of the file
-                        payload = upload_file.read(chunk_size)
-                        chunk_size = len(payload)
-                        file_offset = 0
-                        retry_count = 0
-                        max_retries = int(args.retry)
-                        while(chunk_size > 0):
-                            sys.stdout.flush()
-                            # transmit payload using binary methods
-                            querystring = {'mid': args.mid, 'vid': args.vid, 'offset': file_offset, 'len': chunk_size, 'binary': 'y'}
-                            r = request_post_with_auth(args.url + '/write_var', querystring, payload, args.user, args.password, args.timeout)
-
-                            # Did we transfer successfully?
-                            if(r.status_code == 200):
-                                # update offset to write to, based on last chunk_size written
-                                file_offset += chunk_size
-                                # Grab the next binary chunk
-                                payload = upload_file.read(chunk_size)
-                                # update chunk_size to match what was actually grabbed (may be less if chunk_size was less than remaining length)
-                                chunk_size = len(payload)
-
-                                if(args.verbose):
-                                    strCompleteness = '#' * int(file_offset / float(file_size) * 50)
-                                    print("\rUploading [%-50s]" % (strCompleteness), end="")
-                            # Retry up to X times
-                            elif(r.status_code == 405):
+                        try:
+                            written = transfer.upload(client, mid, vid, upload_file, chunk_size, int(args.window), int(args.retry), transfer.progress_bar("Uploading") if args.verbose else None, journal, args.diff, element_size)
+                        except transfer.TransferError as e:
+                            if(e.status_code == 405):
                                 print("\nUpload Failed! Variable is Locked or Read-Only")
-                                sys.exit(1)
-                            elif(retry_count < max_retries):
-                                retry_count += 1
-                                print("\nUpload attempt failed, retrying...")
                             else:
-                                print("Failed to upload " + os.path.basename(upload_file.name))
-                                sys.exit(1)
+                                print("\nFailed to upload " + os.path.basename(upload_file.name) + ": " + str(e))
+                                if(journal):
+                                    print("Rerun with --resume to continue from the last written chunk")
+                            if(journal):
+                                journal.close()
+                            sys.exit(1)
+                        except ValueError as e:
+                            # File doesn't fit the variable's elements, nothing was sent
+                            print("\nFailed to upload " + os.path.basename(upload_file.name) + ": " + str(e))
+                            if(journal):
+                                journal.remove()
+                            sys.exit(1)
+
+                        if(journal):
+                            journal.remove()
 
                         if(args.verbose):
                             print("\nDone uploading " + os.path.basename(upload_file.name))
+                            if(args.diff):
+                                print("%d of %d bytes differed and were written" % (written, os.fstat(upload_file.fileno()).st_size))
 
                         # All done uploading file, exit
                         sys.exit(0)
 
                     else:
-                        if(args.verbose):
-                            err = r.json()
-                            print('\tStatus: ' + str(err['error']['status']) + '\n\tCode: ' + str(err['error']['code']) + '\n\tMeaning: ' + err['error']['meaning'] + '\n\tMessage: ' + err['error']['message'] + '\n')
                         sys.exit(1)
 
             elif(args.command == 'download'):
+                from . import transfer
+                from . import binary
+
                 # Keys should always be lower case
                 args.mid = args.mid.lower()
                 args.vid = args.vid.lower()
+                # Resuming needs the partially downloaded file left intact
+                if(args.resume and os.path.exists(args.file)):
+                    file_mode = 'r+b'
+                else:
+                    file_mode = 'w+b'
+
+                try:
+                    download_file = open(args.file, file_mode)
+                except (IOError, OSError):
+                    print("Error opening file for writing")
+                    sys.exit(1)
+
                 # Get var info first, need to know max chunk size of file to send
-                with args.file as download_file:
-                    querystring = {'mid': args.mid, 'vid': args.vid}
-                    r = request_get_with_auth(args.url + '/read_var', querystring, args.user, args.password, args.timeout)
+                with download_file:
+                    try:
+                        vinfo = metadata.variable(client, args.mid, args.vid)
+                        # Chunks go by numeric id, the node then needn't look the keys up each time
+                        mid, vid = metadata.resolve(client, args.mid, args.vid)
+                    except EsperError as e:
+                        vinfo = None
+                        if(args.verbose):
+                            print(e)
 
-                    if(r.status_code == 200):
-                        # Var found, lets see what we got!
-                        vinfo = r.json()
+                    if(vinfo is not None):
                         # Always use the 'max_req_size', otherwise certain flash devices like EPCQs may have issue with multiple chunks to the same block..
                         chunk_size = vinfo['max_req_size']
-                        # Get the size of the file and then return to the start
-                        file_size = vinfo['len']
+                        # len counts elements, the file holds their bytes
+                        element_size = binary.esper_dtype(vinfo['type']).itemsize
+                        file_size = vinfo['len'] * element_size
+
+                        journal = None
+                        if(args.resume):
+                            # Skip chunks a previous failed run already fetched
+                            journal = transfer.TransferJournal(download_file.name + '.journal', 'download', args.mid, args.vid, file_size, chunk_size)
+                            if(journal.load() and args.verbose):
+                                print("Resuming download, %d chunk(s) already fetched" % len(journal.completed))
+                            journal.open()
 
                         if(args.verbose):
                             print("Downloading [%-50s]" % (" "), end="")
 
-                        # Get the first chunk of the file
-                        file_offset = 0
-                        retry_count = 0
-                        max_retries = int(args.retry)
-                        while(file_offset < file_size):
-                            sys.stdout.flush()
-
-                            if(chunk_size > (file_size - file_offset)):
-                                chunk_size = file_size - file_offset
-
-                            # transmit payload using binary methods
-                            querystring = {'mid': args.mid, 'vid': args.vid, 'offset': file_offset, 'len': chunk_size, 'binary': 'y', 'dataOnly': 'y'}
-                            r = request_get_with_auth(args.url + '/read_var', querystring, args.user, args.password, args.timeout)
-
-                            # Did we transfer successfully?
-                            if(r.status_code == 200):
-                                # update offset to write to, based on last chunk_size written
-                                file_offset += len(r.content)
-
-                                # Grab the next binary chunk
-                                download_file.write(r.content)
+                        try:
+                            transfer.download(client, mid, vid, download_file, file_size, chunk_size, int(args.window), int(args.retry), transfer.progress_bar("Downloading") if args.verbose else None, journal, element_size)
+                        except transfer.TransferError as e:
+                            print("\nFailed to download " + os.path.basename(download_file.name) + ": " + str(e))
+                            if(journal):
+                                print("Rerun with --resume to continue from the last fetched chunk")
+                                journal.close()
+                            sys.exit(1)
 
-                                if(args.verbose):
-                                    strCompleteness = '#' * int(file_offset / float(file_size) * 50)
-                                    print("\rDownloading [%-50s]" % (strCompleteness), end="")
-
-                            # Retry up to X times
-                            elif(retry_count < max_retries):
-                                retry_count += 1
-                                print("\nDownload attempt failed, retrying...")
-                            else:
-                                print("Failed to download " + os.path.basename(download_file.name))
-                                sys.exit(1)
+                        if(journal):
+                            journal.remove()
 
                         if(args.verbose):
                             print("\nDone download to " + os.path.basename(download_file.name))
@@ -1131,14 +673,85 @@ def main():
                         sys.exit(0)
 
                     else:
-                        if(args.verbose):
-                            err = r.json()
-                            print('\tStatus: ' + str(err['error']['status']) + '\n\tCode: ' + str(err['error']['code']) + '\n\tMeaning: ' + err['error']['meaning'] + '\n\tMessage: ' + err['error']['message'] + '\n')
                         sys.exit(1)
 
+            elif(args.command == 'watch'):
+                from . import monitor
+
+                try:
+                    specs = [parse_var_spec(var) for var in args.vars]
+                except ValueError as e:
+                    print(e)
+                    sys.exit(1)
+
+                # Polled by numeric id, output still uses the names given
+                try:
+                    targets = [metadata.resolve_spec(client, spec) for spec in specs]
+                except EsperError as e:
+                    print(e)
+                    sys.exit(1)
+
+                if(args.changes):
+                    watcher = monitor.Watcher(client, targets, float(args.rate), monitor.ChangeTracker())
+                else:
+                    watcher = monitor.Watcher(client, targets, float(args.rate))
+                try:
+                    watcher.run(monitor.WatchWriter(args.file, specs, args.format), int(args.count), float(args.duration))
+                except KeyboardInterrupt:
+                    pass
+
+                if(args.verbose and watcher.scheduler.missed):
+                    print("Missed %d sample(s), requests took longer than the sample period" % watcher.scheduler.missed, file=sys.stderr)
+                sys.exit(0)
+
+            elif(args.command == 'record'):
+                from . import monitor
+                from . import recorder
+
+                try:
+                    specs = [parse_var_spec(var) for var in args.vars]
+                except ValueError as e:
+                    print(e)
+                    sys.exit(1)
+
+                # Type and length of each variable fix the recording's columns
+                try:
+                    vinfos = [metadata.variable(client, spec.mid, spec.vid) for spec in specs]
+                    targets = [metadata.resolve_spec(client, spec) for spec in specs]
+                except EsperError as e:
+                    print(e)
+                    sys.exit(1)
+
+                watcher = monitor.Watcher(client, targets, float(args.rate))
+                recording = recorder.Recorder(args.file, specs, vinfos, client.url, float(args.rate), int(args.chunk or recorder.DEFAULT_CHUNK_SAMPLES))
+                try:
+                    watcher.run(recording, int(args.count), float(args.duration))
+                except KeyboardInterrupt:
+                    pass
+                finally:
+                    recording.close()
+
+                if(args.verbose):
+                    print("Recorded %d sample(s) in %d chunk(s) to %s" % (recording.samples, recording.chunks, args.file))
+                    if(watcher.scheduler.missed):
+                        print("Missed %d sample(s), requests took longer than the sample period" % watcher.scheduler.missed)
+                sys.exit(0)
+
             elif(args.command == 'discover'):
-                # Send out discover packet
-                resp = esper.EsperUDP().send_discovery(
+                import datetime
+                from . import esper
+
+                # Bad targets are reported before anything is sent
+                if(args.target):
+                    try:
+                        args.target = esper.discovery_targets(args.target)
+                    except ValueError as e:
+                        print(e)
+                        sys.exit(1)
+
+                # Send out discover packets, printing devices as they answer
+                found = 0
+                for device in esper.EsperUDP().discover(
                     args.id,
                     args.name,
                     args.type,
@@ -1146,125 +759,207 @@ def main():
                     args.hwid,
                     args.auth,
                     args.timeout,
-                    args.verbose
-                )
+                    int(args.rounds),
+                    int(args.count),
+                    args.target
+                ):
+                    found += 1
+                    if(args.verbose):
+                        print(device)
 
-                # Pretty print responses
-                print("Discovered %u device(s)" % len(resp))
-                for device in resp:
+                    # Pretty print responses
                     print("\n%s\n\t%s Module %s, Revision %s\n\t%s\n\tStarted %s (%s)\n" % (
-                        device['url'],
-                        device['name'],
-                        device['module_id'],
-                        device['revision'],
-                        device['hardware_id'],
-                        datetime.datetime.fromtimestamp((time.time() - device['uptime'])).strftime('%Y-%m-%d %H:%M:%S'),
-                        datetime.timedelta(seconds=(device['uptime']))
+                        device.url,
+                        device.name,
+                        device.module_id,
+                        device.revision,
+                        device.hardware_id,
+                        datetime.datetime.fromtimestamp((time.time() - device.uptime)).strftime('%Y-%m-%d %H:%M:%S'),
+                        datetime.timedelta(seconds=(device.uptime))
                     ))
+                    sys.stdout.flush()
 
+                print("Discovered %u device(s)" % found)
                 sys.exit(0)
 
             elif(args.command == 'get-config'):
-                config = get_configuration(args)
+                from .config import get_configuration
+
+                config = get_configuration(client, args.jobs)
                 json_config = json.dumps(config, indent = 2)
                 args.file.write(json_config)
                 sys.exit(0)
             elif(args.command == 'set-config'):
-                current_config = get_configuration(args)
+                from .config import get_configuration, set_configuration
+
+                metadata = dict()
+                current_config = get_configuration(client, args.jobs, metadata)
                 config = json.loads(args.file.read())
-                for module in config:
-                    for var in config[module]:
-                        if(not np.array_equal(config[module][var],current_config[module][var])):
-                            querystring = {'mid': module, 'vid': var }
-                            r = request_post_with_auth(args.url + '/write_var', querystring, json.dumps(config[module][var]), args.user, args.password, args.timeout)
-                            if(r.status_code == 200):
-                                print("Wrote to " + str(module) + "/" + str(var) + " " + json.dumps(config[module][var]))
-                            else:
-                                print("Failed writing to " + str(module) + "/" + str(var) + " " + json.dumps(config[module][var]) + " Status code: " + str(r.status_code))
+                for module, var, status_code in set_configuration(client, config, current_config, args.jobs, args.ordered, metadata, float(args.rtol), float(args.atol)):
+                    if(status_code == 200):
+                        print("Wrote to " + str(module) + "/" + str(var) + " " + json.dumps(config[module][var]))
+                    else:
+                        print("Failed writing to " + str(module) + "/" + str(var) + " " + json.dumps(config[module][var]) + " Status code: " + str(status_code))
                 sys.exit(0)
 
             elif(args.command == 'diff'):
-                delta_config = dict()
-                current_config = get_configuration(args)
-                config = json.loads(args.file.read())
-                for module in config:
-                    delta_config[module] = dict()
-                    for var in config[module]:
-                        if(not np.array_equal(config[module][var],current_config[module][var])):
-                            delta_config[module][var] = config[module][var]
-                            print(str(module) + "/" + str(var) + " Config: " + str(config[module][var]) + " Device: " + str(current_config[module][var]))
-
-
+                from .config import get_configuration, compare_configuration
+                from .compare import format_ranges
 
+                metadata = dict()
+                current_config = get_configuration(client, args.jobs, metadata)
+                config = json.loads(args.file.read())
+                changes = compare_configuration(config, current_config, metadata, float(args.rtol), float(args.atol))
                 final_config = dict()
-                for key in delta_config:
-                    if len(delta_config[key]) > 0:
-                        final_config[key] = delta_config[key]
+                for module in changes:
+                    final_config[module] = dict()
+                    for var in changes[module]:
+                        final_config[module][var] = config[module][var]
+                        print(str(module) + "/" + str(var) + " Config: " + str(config[module][var]) + " Device: " + str(current_config[module][var]))
+                        if(args.verbose):
+                            print("\tChanged elements: " + format_ranges(changes[module][var]))
 
                 if(args.delta and (len(final_config) > 0)):
                     args.delta.write(json.dumps(final_config, indent=2))
 
                 sys.exit(0)
-            else:
-                # No options selected, this should never be reached
+
+            elif(args.command == 'fleet'):
+                from .fleet import run_fleet, discovered_urls
+
+                urls = list(args.urls)
+                if(args.urls_file):
+                    urls += [line.strip() for line in args.urls_file if line.strip() and not line.strip().startswith('#')]
+                if(args.discover):
+                    from . import esper
+
+                    urls += discovered_urls(esper.EsperUDP().discover(timeout=float(args.discover_timeout)))
+
+                if(not urls):
+                    print("No nodes given or discovered")
+                    sys.exit(1)
+
+                config = None
+                if(args.action != 'get-config'):
+                    if(not args.file):
+                        print(args.action + " needs a configuration file (-f)")
+                        sys.exit(1)
+                    config = json.loads(args.file.read())
+
+                result = run_fleet(urls, args.action, config, args.user, args.password, args.timeout, args.pool, args.jobs, args.nodes, float(args.node_timeout), args.ordered, float(args.rtol), float(args.atol))
+                args.output.write(json.dumps(result, indent=2) + '\n')
+
+                failed = [url for url in result['nodes'] if result['nodes'][url]['status'] != 'ok']
+                if(failed):
+                    if(args.verbose):
+                        print("%d of %d node(s) failed: %s" % (len(failed), len(result['nodes']), ', '.join(failed)), file=sys.stderr)
+                    sys.exit(1)
                 sys.exit(0)
 
-        except requests.exceptions.Timeout:
-            # Maybe set up for a retry, or continue in a retry loop
-            print('Timed out attempting to communicate with ' + args.url + "\n")
-            sys.exit(1)
+            elif(args.command == 'batch'):
+                from . import batch
 
-        except requests.exceptions.TooManyRedirects:
-            # Tell the user their URL was bad and try a different one
-            print('Timed out attempting to communicate with ' + args.url + "\n")
-            sys.exit(1)
+                # stdout is the results, one JSON object per line, so nothing else may be
+                # printed there. Request failures become the failed operation's result
+                client.raise_errors = True
+
+                # The whole script is checked before anything is sent to the node
+                with args.file as script:
+                    try:
+                        stages = batch.parse_batch(script)
+                    except ValueError as e:
+                        print(e, file=sys.stderr)
+                        sys.exit(1)
+
+                runner = batch.BatchRunner(client, metadata, stages, int(args.jobs), int(args.window), int(args.retry), args.stop_on_error)
+                try:
+                    runner.resolve()
+                except ValueError as e:
+                    print(e, file=sys.stderr)
+                    sys.exit(1)
+
+                def emit(result):
+                    args.output.write(json.dumps(result) + '\n')
+                    args.output.flush()
+
+                failed = runner.run(emit)
+                if(args.verbose and failed):
+                    print("%d operation(s) failed" % failed, file=sys.stderr)
+                sys.exit(1 if failed else 0)
 
-        except requests.exceptions.RequestException as e:
-            # catastrophic error. bail.
-            print('Uncaught error: ')
-            print(e)
+            elif(args.command == 'daemon'):
+                from . import daemon
+
+                path = args.socket or daemon.default_socket_path()
+                if(args.status or args.stop):
+                    status = daemon.call_daemon(path, 'stop' if args.stop else 'status')
+                    if(status is None):
+                        print("No daemon running at " + path)
+                        sys.exit(1)
+                    if(args.stop):
+                        # Wait for it to remove its socket, so a daemon started straight after doesn't race it
+                        for n in range(50):
+                            if(not os.path.exists(path)):
+                                break
+                            time.sleep(0.1)
+                        print("Stopped daemon %d" % status['pid'])
+                    else:
+                        print("Daemon %d (esper-tool %s) at %s, up %.0f seconds, %d request(s) served" % (status['pid'], status['version'], path, status['uptime'], status['requests']))
+                        for url in status['nodes']:
+                            print("\t" + url)
+                    sys.exit(0)
+
+                if(not hasattr(daemon.socket, 'AF_UNIX')):
+                    print("The daemon needs Unix domain sockets, which this platform doesn't have")
+                    sys.exit(1)
+
+                server = daemon.Daemon(path, float(args.cache_ttl), args.cache)
+                try:
+                    server.bind()
+                except (IOError, OSError) as e:
+                    print("Unable to start daemon: " + str(e))
+                    sys.exit(1)
+
+                if(args.detach):
+                    pid = server.detach()
+                    if(args.verbose):
+                        print("Daemon %d listening on %s" % (pid, path))
+                    sys.exit(0)
+
+                if(args.verbose):
+                    print("Listening on " + path)
+                try:
+                    server.serve()
+                except KeyboardInterrupt:
+                    pass
+                sys.exit(0)
+
+            else:
+                # No options selected, this should never be reached
+                sys.exit(0)
+
+        except Exception as e:
+            # requests is only loaded once a node is talked to directly, so anything
+            # raised without it is not a request failure
+            requests = sys.modules.get('requests')
+            if((requests is None) or (not isinstance(e, requests.exceptions.RequestException))):
+                raise
+
+            if(isinstance(e, requests.exceptions.Timeout)):
+                # Maybe set up for a retry, or continue in a retry loop
+                print('Timed out attempting to communicate with ' + args.url + "\n")
+            elif(isinstance(e, requests.exceptions.TooManyRedirects)):
+                # Tell the user their URL was bad and try a different one
+                print('Timed out attempting to communicate with ' + args.url + "\n")
+            else:
+                # catastrophic error. bail.
+                print('Uncaught error: ')
+                print(e)
             sys.exit(1)
 
     except KeyboardInterrupt:
         print("\nExiting " + prog)
         sys.exit(0)
 
-def get_configuration(args):
-    def get_module_variables(mid):
-        vars = dict()
-        querystring = {'mid': mid, 'includeVars': 'y', 'includeData': 'y'}
-        r = request_get_with_auth(args.url + '/read_module', querystring, args.user, args.password, args.timeout)
-        if(r.status_code == 200):
-            resp = r.json()
-            for i in range(0, len(resp['var'])):
-                # Only get variables that can be written to, and have data (ie: not Null)
-                if(resp['var'][i]['opt'] & 0x2) and (resp['var'][i]['d'] != None):
-                    vars[resp['var'][i]['key']] = resp['var'][i]['d']
-        else:
-            print("Error")
-        return vars
-
-    def get_modules():
-        querystring = {'includeMods': 'y'}
-        r = request_get_with_auth(args.url + '/read_node', querystring, args.user, args.password, args.timeout)
-        modules = []
-        if(r.status_code == 200):
-            resp = r.json()
-            for i in range(0, len(resp['module'])):
-                if(resp['module'][i]['key'] != "system") and (resp['module'][i]['key'] != "storage") and (resp['module'][i]['key'] != "build") and (resp['module'][i]['key'] != "template"):
-                    modules.append(resp['module'][i]['key'])
-        return modules
-
-    config = dict()
-    for module in get_modules():
-        config[module] = get_module_variables(module)
-
-    final_config = dict()
-    for key in config:
-        if len(config[key]) > 0:
-            final_config[key] = config[key]
-
-    return final_config
-
 if __name__ == "__main__":
     main()
@@ -0,0 +1,309 @@
+"""
+ESPER Asyncio Client
+
+Library API for talking to many ESPER nodes from one process. Needs Python 3.5+
+and aiohttp (pip install esper-tool[async]). Errors are raised, never printed.
+"""
+
+import asyncio
+import json
+
+try:
+    import aiohttp
+except ImportError:
+    raise ImportError("esper_tool.aio needs aiohttp, install it with 'pip install esper-tool[async]'")
+
+from .binary import esper_dtype
+from .client import EsperError, DEFAULT_POOL_SIZE, normalize_url
+from .esper import EsperUDP
+from .transfer import TransferError, chunk_ranges, element_chunk_size
+
+
+class AsyncResponse(object):
+    """Status and body of a finished request, shaped like the parts of requests.Response EsperError uses"""
+
+    def __init__(self, status_code, content):
+        self.status_code = status_code
+        self.content = content
+
+    def json(self):
+        return json.loads(self.content.decode('utf-8'))
+
+
+class AsyncEsperClient(object):
+    """Asyncio client for a single ESPER node
+
+    Coroutines return decoded JSON (bytes for binary reads) and raise EsperError for
+    error responses, aiohttp.ClientError/asyncio.TimeoutError for connection
+    problems. Pass a shared aiohttp.ClientSession when talking to many nodes so they
+    share one connection pool, otherwise the client opens (and closes) its own with
+    up to pool_size keep-alive connections.
+
+        async with AsyncEsperClient('http://node') as node:
+            uptime = await node.read_var('system', 'uptime', data_only=True)
+    """
+
+    def __init__(self, url, user=False, password=False, timeout=5, pool_size=DEFAULT_POOL_SIZE, session=None):
+        self.url = normalize_url(url)
+        self.auth = aiohttp.BasicAuth(user, password or '') if user else None
+        self.timeout = timeout
+        self.pool_size = int(pool_size)
+        self.session = session
+        self.own_session = session is None
+
+    async def request(self, method, path, params, payload=None):
+        """Make a request, returns an AsyncResponse whatever its status"""
+        if(self.session is None):
+            self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit_per_host=self.pool_size))
+        # aiohttp only takes str query values
+        params = dict((key, str(value)) for key, value in params.items())
+        async with self.session.request(method, self.url + path, params=params, data=payload, auth=self.auth, timeout=aiohttp.ClientTimeout(total=self.timeout)) as r:
+            return AsyncResponse(r.status, await r.read())
+
+    async def call(self, method, path, params, payload=None):
+        r = await self.request(method, path, params, payload)
+        if(r.status_code != 200):
+            raise EsperError(r)
+        return r
+
+    async def read_node(self, include_mods=True):
+        r = await self.call('GET', '/read_node', {'includeMods': 'y' if include_mods else 'n'})
+        return r.json()
+
+    async def read_module(self, mid, include_vars=False, include_data=False):
+        querystring = {'mid': mid, 'includeVars': 'y' if include_vars else 'n', 'includeData': 'y' if include_data else 'n'}
+        r = await self.call('GET', '/read_module', querystring)
+        return r.json()
+
+    async def read_var(self, mid, vid, offset=0, length=0, include_data=True, data_only=False):
+        """Read a variable's descriptor and/or data, length 0 reads to the end"""
+        querystring = {'mid': mid, 'vid': vid, 'offset': offset, 'len': length, 'includeData': 'y' if include_data else 'n'}
+        if(data_only):
+            querystring['dataOnly'] = 'y'
+        r = await self.call('GET', '/read_var', querystring)
+        return r.json()
+
+    async def write_var(self, mid, vid, data, offset=0):
+        """Write JSON encodable data (or an already encoded JSON string) at element offset"""
+        if(not isinstance(data, str)):
+            data = json.dumps(data)
+        r = await self.call('POST', '/write_var', {'mid': mid, 'vid': vid, 'offset': offset}, data)
+        return r.json()
+
+    async def read_binary(self, mid, vid, offset, length, retries=3):
+        """Read length elements at element offset as raw little endian bytes"""
+        querystring = {'mid': mid, 'vid': vid, 'offset': offset, 'len': length, 'binary': 'y', 'dataOnly': 'y'}
+        for attempt in range(retries + 1):
+            r = await self.request('GET', '/read_var', querystring)
+            if(r.status_code == 200):
+                return r.content
+        raise TransferError("Failed to read %d elements at offset %d" % (length, offset), r.status_code)
+
+    async def write_binary(self, mid, vid, offset, payload, retries=3, element_size=1):
+        """Write raw little endian bytes starting at element offset
+
+        payload has to hold whole elements, element_size bytes each.
+        """
+        querystring = {'mid': mid, 'vid': vid, 'offset': offset, 'len': len(payload) // element_size, 'binary': 'y'}
+        for attempt in range(retries + 1):
+            r = await self.request('POST', '/write_var', querystring, payload)
+            if(r.status_code == 200):
+                return
+            elif(r.status_code == 405):
+                raise TransferError("Variable is Locked or Read-Only", r.status_code)
+        raise TransferError("Failed to write %d elements at offset %d" % (len(payload) // element_size, offset), r.status_code)
+
+    async def download(self, mid, vid, window=4, retries=3, progress=None):
+        """Read a whole variable in max_req_size binary chunks, up to window at once
+
+        Returns the variable's raw little endian bytes. progress(bytes_done, total)
+        is called after every chunk.
+        """
+        vinfo = await self.read_var(mid, vid, include_data=False)
+        element_size = esper_dtype(vinfo['type']).itemsize
+        size = vinfo['len'] * element_size
+        chunk_size = element_chunk_size(vinfo['max_req_size'], element_size)
+        data = bytearray(size)
+        done = [0]
+
+        async def fetch(offset, length):
+            chunk = await self.read_binary(mid, vid, offset // element_size, length // element_size, retries)
+            if(len(chunk) != length):
+                raise TransferError("Failed to read %d bytes at offset %d" % (length, offset))
+            data[offset:offset + length] = chunk
+            done[0] += length
+            if(progress):
+                progress(done[0], size)
+
+        await self.run_windowed([fetch(offset, length) for offset, length in chunk_ranges(size, chunk_size)], window)
+        return data
+
+    async def upload(self, mid, vid, data, window=1, retries=3, progress=None):
+        """Write bytes to a variable in max_req_size binary chunks
+
+        With the default window of 1 chunks are written strictly in order, one at a
+        time, as flash backed variables (ie: EPCQs) need. Larger windows keep that
+        many chunks in flight. data is written from the first element, so has to
+        hold whole elements of the variable's type.
+        """
+        vinfo = await self.read_var(mid, vid, include_data=False)
+        element_size = esper_dtype(vinfo['type']).itemsize
+        chunk_size = element_chunk_size(vinfo['max_req_size'], element_size)
+        done = [0]
+
+        # Released on the way out, so a bytearray passed in can be resized again afterwards
+        with memoryview(data) as source, source.cast('B') as view:
+            if(len(view) % element_size):
+                raise ValueError("%d bytes isn't a whole number of %d byte elements" % (len(view), element_size))
+
+            async def send(offset, length):
+                await self.write_binary(mid, vid, offset // element_size, bytes(view[offset:offset + length]), retries, element_size)
+                done[0] += length
+                if(progress):
+                    progress(done[0], len(view))
+
+            await self.run_windowed([send(offset, length) for offset, length in chunk_ranges(len(view), chunk_size)], window)
+
+    async def run_windowed(self, jobs, window):
+        """Await every job (a coroutine), up to window at once, stopping at the first to fail"""
+        try:
+            if(window <= 1):
+                for job in jobs:
+                    await job
+                return
+
+            semaphore = asyncio.Semaphore(window)
+
+            async def limited(job):
+                async with semaphore:
+                    await job
+
+            tasks = [asyncio.ensure_future(limited(job)) for job in jobs]
+            try:
+                await asyncio.gather(*tasks)
+            finally:
+                # One chunk failing stops the rest
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            # Chunks never started have to be closed, or they warn they were never awaited
+            for job in jobs:
+                job.close()
+
+    async def close(self):
+        if(self.own_session and (self.session is not None)):
+            await self.session.close()
+            self.session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+
+async def map_nodes(urls, func, concurrency=64, **client_args):
+    """Run await func(client) against every node, up to concurrency nodes at once
+
+    All nodes share one connection pool, holding up to pool_size (from client_args)
+    connections to each node however many transfers run against it. Returns
+    {url: result}, where a node that raised has the exception as its result instead,
+    so one bad node never stops the rest.
+    """
+    urls = [normalize_url(url) for url in urls]
+    semaphore = asyncio.Semaphore(concurrency)
+    connector = aiohttp.TCPConnector(limit=0, limit_per_host=int(client_args.get('pool_size', DEFAULT_POOL_SIZE)))
+    async with aiohttp.ClientSession(connector=connector) as session:
+        async def run(url):
+            async with semaphore:
+                try:
+                    return await func(AsyncEsperClient(url, session=session, **client_args))
+                except Exception as e:
+                    return e
+
+        results = await asyncio.gather(*[run(url) for url in urls])
+    return dict(zip(urls, results))
+
+
+class Discovery(object):
+    """Async iterator over the devices found by EsperUDP.discover(), see discover()
+
+    A class rather than an async generator, which would need Python 3.6.
+    """
+
+    def __init__(self, args, kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        self.found = None
+        self.scanner = None
+        self.finished = False
+        self.done = object()
+
+    def scan(self, loop):
+        try:
+            for device in EsperUDP().discover(*self.args, **self.kwargs):
+                loop.call_soon_threadsafe(self.found.put_nowait, device)
+        finally:
+            loop.call_soon_threadsafe(self.found.put_nowait, self.done)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if(self.finished):
+            raise StopAsyncIteration
+        if(self.scanner is None):
+            loop = asyncio.get_event_loop()
+            self.found = asyncio.Queue()
+            self.scanner = loop.run_in_executor(None, self.scan, loop)
+
+        device = await self.found.get()
+        if(device is self.done):
+            self.finished = True
+            # Raise anything the scan failed with
+            await self.scanner
+            raise StopAsyncIteration
+        return device
+
+
+def discover(*args, **kwargs):
+    """Async iterator over the devices found by EsperUDP.discover(), takes the same arguments
+
+        async for device in discover(timeout=2, count=10):
+            ...
+
+    The scan itself runs in a worker thread and keeps going until its timeout or
+    count even if iteration stops early.
+    """
+    return Discovery(args, kwargs)
+
+
+class SyncEsperClient(object):
+    """Blocking wrapper around AsyncEsperClient, each call runs the coroutine to completion
+
+    For scripts that don't run their own event loop. Not usable from inside one.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.loop = asyncio.new_event_loop()
+        self.client = AsyncEsperClient(*args, **kwargs)
+
+    def __getattr__(self, name):
+        method = getattr(self.client, name)
+        if(not asyncio.iscoroutinefunction(method)):
+            return method
+
+        def run(*args, **kwargs):
+            return self.loop.run_until_complete(method(*args, **kwargs))
+        return run
+
+    def close(self):
+        self.loop.run_until_complete(self.client.close())
+        self.loop.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,182 @@
+"""
+ESPER Batch Scripts
+"""
+
+# Added for python2 compat
+from __future__ import (absolute_import, division, print_function, unicode_literals)
+
+import json
+import time
+from collections import namedtuple, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from . import transfer
+from .binary import esper_dtype
+from .client import EsperError
+from .varspec import parse_var_spec, format_var_spec
+
+BATCH_OPS = ('read', 'write', 'upload')
+
+# One line of a batch script. value is the decoded JSON of a write, path the file of an upload
+BatchOp = namedtuple('BatchOp', ['line', 'op', 'spec', 'value', 'path'])
+
+# Separates the stages of a script
+BARRIER = 'barrier'
+
+
+def parse_batch(lines):
+    """Parse a whole batch script into stages, lists of BatchOps, raising ValueError on the first bad line
+
+    One operation per line:
+
+        read   mid/vid[offset:len]
+        write  mid/vid[offset] <JSON value or array>
+        upload mid/vid <file>     (from the first element, so no [offset:len])
+        barrier
+
+    Blank lines and lines starting with # are skipped. barrier ends a stage, every
+    operation before it finishes before any after it starts.
+    """
+    stages = [[]]
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if((not line) or line.startswith('#')):
+            continue
+
+        words = line.split(None, 2)
+        op = words[0].lower()
+        if(op == BARRIER):
+            if(len(words) > 1):
+                raise ValueError("line %d: barrier takes no arguments" % number)
+            if(stages[-1]):
+                stages.append([])
+            continue
+        if(op not in BATCH_OPS):
+            raise ValueError("line %d: unknown operation '%s', expected one of %s or %s" % (number, words[0], ', '.join(BATCH_OPS), BARRIER))
+        if(len(words) < 2):
+            raise ValueError("line %d: %s needs a mid/vid" % (number, op))
+
+        try:
+            spec = parse_var_spec(words[1])
+        except ValueError as e:
+            raise ValueError("line %d: %s" % (number, e))
+
+        value = None
+        path = None
+        if(op == 'read'):
+            if(len(words) > 2):
+                raise ValueError("line %d: unexpected '%s' after read" % (number, words[2]))
+        elif(len(words) < 3):
+            raise ValueError("line %d: %s needs %s" % (number, op, 'a value' if op == 'write' else 'a file'))
+        elif(op == 'write'):
+            try:
+                value = json.loads(words[2])
+            except ValueError:
+                raise ValueError("line %d: '%s' is not a JSON value" % (number, words[2]))
+        elif(spec.offset or spec.length):
+            raise ValueError("line %d: upload always writes from the first element, remove the [offset:len] from '%s'" % (number, words[1]))
+        else:
+            path = words[2]
+
+        stages[-1].append(BatchOp(number, op, spec, value, path))
+
+    return [stage for stage in stages if stage]
+
+
+class BatchRunner(object):
+    """Run a parsed batch script against one node
+
+    Every variable the script touches is looked up once before anything runs, so a
+    typo fails the script up front instead of halfway through a bring-up, and the
+    operations themselves go by numeric id. Within a stage up to jobs operations run
+    at once, except that operations on the same variable always run in script
+    order. Results come out one per operation, in script order, as each stage ends.
+    """
+
+    def __init__(self, client, metadata, stages, jobs=4, window=1, retries=3, stop_on_error=False):
+        self.client = client
+        self.metadata = metadata
+        self.stages = stages
+        self.jobs = max(1, int(jobs))
+        self.window = max(1, int(window))
+        self.retries = int(retries)
+        self.stop_on_error = stop_on_error
+        self.vinfos = dict()
+        self.targets = dict()
+
+    def resolve(self):
+        """Look up every variable in the script, raising ValueError naming the first that can't be"""
+        lines = OrderedDict()
+        for stage in self.stages:
+            for op in stage:
+                lines.setdefault((op.spec.mid, op.spec.vid), op.line)
+        keys = list(lines)
+
+        def lookup(key):
+            try:
+                return (self.metadata.variable(self.client, *key), self.metadata.resolve(self.client, *key))
+            except (EsperError, IOError, OSError) as e:
+                raise ValueError("line %d: %s/%s: %s" % (lines[key], key[0], key[1], e))
+
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            for key, (vinfo, target) in zip(keys, executor.map(lookup, keys)):
+                self.vinfos[key] = vinfo
+                self.targets[key] = target
+
+    def run(self, emit):
+        """Run every stage, calling emit(result) for each operation, returns the number that failed"""
+        if(not self.vinfos):
+            self.resolve()
+
+        failed = 0
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            for stage in self.stages:
+                if(failed and self.stop_on_error):
+                    for op in stage:
+                        emit(self.result(op, 'skipped'))
+                    continue
+
+                # Operations on the same variable stay in order, different variables overlap
+                groups = OrderedDict()
+                for op in stage:
+                    groups.setdefault((op.spec.mid, op.spec.vid), []).append(op)
+                results = dict()
+                for group_results in executor.map(lambda group: [(op.line, self.execute(op)) for op in group], groups.values()):
+                    results.update(group_results)
+
+                for op in stage:
+                    if(results[op.line]['status'] != 'ok'):
+                        failed += 1
+                    emit(results[op.line])
+        return failed
+
+    def result(self, op, status, **fields):
+        result = OrderedDict([('line', op.line), ('op', op.op), ('var', format_var_spec(op.spec)), ('status', status)])
+        result.update(fields)
+        return result
+
+    def execute(self, op):
+        """Run one operation, never raising"""
+        mid, vid = self.targets[(op.spec.mid, op.spec.vid)]
+        start = time.time()
+        try:
+            if(op.op == 'read'):
+                r = self.client.get('/read_var', {'mid': mid, 'vid': vid, 'offset': op.spec.offset, 'len': op.spec.length, 'dataOnly': 'y'})
+                if(r.status_code != 200):
+                    raise EsperError(r)
+                return self.result(op, 'ok', data=r.json(), elapsed=round(time.time() - start, 6))
+
+            elif(op.op == 'write'):
+                r = self.client.post('/write_var', {'mid': mid, 'vid': vid, 'offset': op.spec.offset}, json.dumps(op.value))
+                if(r.status_code != 200):
+                    raise EsperError(r)
+                return self.result(op, 'ok', elapsed=round(time.time() - start, 6))
+
+            else:
+                vinfo = self.vinfos[(op.spec.mid, op.spec.vid)]
+                with open(op.path, 'rb') as upload_file:
+                    written = transfer.upload(self.client, mid, vid, upload_file, vinfo['max_req_size'], self.window, self.retries, element_size=esper_dtype(vinfo['type']).itemsize)
+                return self.result(op, 'ok', bytes=written, elapsed=round(time.time() - start, 6))
+
+        except (EsperError, transfer.TransferError, ValueError, IOError, OSError) as e:
+            return self.result(op, 'error', error=str(e), elapsed=round(time.time() - start, 6))
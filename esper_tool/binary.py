@@ -0,0 +1,257 @@
+"""
+ESPER Typed Binary Data
+"""
+
+# Added for python2 compat
+from __future__ import (absolute_import, division, print_function, unicode_literals)
+
+import os
+import re
+import sys
+import json
+
+from . import transfer
+
+# numpy is imported by the functions that use it, so importing this module for
+# BINARY_FORMATS (ie: the command line parser) stays cheap
+BINARY_FORMATS = ('npy', 'raw', 'csv')
+
+# printf style format used to write each ESPER type as text, enough digits to round trip floats
+CSV_FORMATS = {9: '%.9g', 10: '%.17g'}
+
+# Files write can take a typed array from, anything else is read as JSON
+ARRAY_FILE_TYPES = ('.npy', '.csv', '.txt')
+
+# JSON payloads up to this size are sent in one request without looking the variable
+# up first, no ESPER service limits requests to less
+SINGLE_WRITE_LIMIT = 1024
+
+# What the command line has always accepted beyond strict JSON: true/false in any case
+# and 'single quoted' strings. Double quoted strings are matched only to be left alone
+LENIENT_TOKEN_RE = re.compile(r'"(?:[^"\\]|\\.)*"|\'([^\']*)\'|\b(true|false)\b', re.IGNORECASE)
+
+# Longest JSON text of one float32/float64 element, Python's repr plus separator
+FLOAT_JSON_WIDTH = 25
+
+
+def esper_dtype(esper_type):
+    """Little endian NumPy dtype of an ESPER type, ascii/raw/unknown types are read as bytes"""
+    import numpy as np
+    from .compare import ESPER_DTYPES
+    return np.dtype(ESPER_DTYPES.get(esper_type, np.uint8)).newbyteorder('<')
+
+
+def read_array(client, mid, vid, vinfo, offset=0, length=0, window=1, retries=3, fmt='npy', path=None, progress=None):
+    """Read an ESPER variable with binary chunked reads and decode it as a typed array
+
+    vinfo is the variable's read_var response (for 'type', 'len' and 'max_req_size').
+    length elements are read starting at element offset, all remaining elements if 0.
+    For 'npy' and 'raw' the array is memory mapped onto path and chunks are written
+    straight into it, so the variable never has to fit in memory. 'csv' reads into
+    memory and writes one element per line to path, or stdout if path is None.
+    Returns the array.
+    """
+    import numpy as np
+
+    dtype = esper_dtype(vinfo['type'])
+    count = int(length) or (vinfo['len'] - int(offset))
+    count = max(0, count)
+
+    if((fmt != 'csv') and (path is None)):
+        raise ValueError("A file is needed to write '%s' data to" % fmt)
+
+    if(fmt == 'npy'):
+        array = np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=(count,))
+    elif((fmt == 'raw') and (count > 0)):
+        array = np.memmap(path, dtype=dtype, mode='w+', shape=(count,))
+    elif(fmt == 'raw'):
+        # Can't map an empty file
+        open(path, 'wb').close()
+        return np.empty(0, dtype=dtype)
+    else:
+        array = np.empty(count, dtype=dtype)
+
+    if(count > 0):
+        transfer.download_into(client, mid, vid, array, vinfo['max_req_size'], window, retries, progress, None, dtype.itemsize, int(offset))
+
+    if(fmt == 'csv'):
+        text_format = CSV_FORMATS.get(vinfo['type'], '%d')
+        if(path is None):
+            np.savetxt(sys.stdout, array, fmt=text_format)
+        else:
+            np.savetxt(path, array, fmt=text_format)
+    else:
+        array.flush()
+
+    return array
+
+
+def lenient_json(text):
+    """Strict JSON from a value typed on the command line, in one pass over the text"""
+    def fix(match):
+        if(match.group(1) is not None):
+            return json.dumps(match.group(1))
+        if(match.group(2) is not None):
+            return match.group(2).lower()
+        return match.group(0)
+    return LENIENT_TOKEN_RE.sub(fix, text)
+
+
+def cast_array(values, dtype):
+    """values (any array like) as a flat contiguous array of dtype, checking every element fits
+
+    Unlike a plain NumPy cast nothing is truncated, wrapped or rounded to a whole
+    number: raises ValueError if an element isn't a number, isn't whole for an
+    integer type, or is out of dtype's range. Booleans also take 0 and 1.
+    """
+    import numpy as np
+
+    try:
+        values = np.asarray(values).ravel()
+    except OverflowError as e:
+        raise ValueError(str(e))
+    if((values.dtype == dtype) or (not len(values))):
+        return np.ascontiguousarray(values, dtype=dtype)
+
+    kind = values.dtype.kind
+    if(kind == 'O'):
+        raise ValueError("Values out of range for %s" % dtype.name)
+    if(kind not in 'biuf'):
+        raise ValueError("Values must be numbers to write as %s" % dtype.name)
+
+    if(dtype.kind in 'iu'):
+        if((kind == 'f') and not (np.all(np.isfinite(values)) and np.all(values == np.trunc(values)))):
+            raise ValueError("Values must be whole numbers to write as %s" % dtype.name)
+        info = np.iinfo(dtype)
+        if((values.min() < info.min) or (values.max() > info.max)):
+            raise ValueError("Values out of range for %s (%d to %d)" % (dtype.name, info.min, info.max))
+    elif(dtype.kind == 'f'):
+        finite = values[np.isfinite(values)] if (kind == 'f') else values
+        if(len(finite) and (np.abs(finite).max() > np.finfo(dtype).max)):
+            raise ValueError("Values out of range for %s" % dtype.name)
+    elif((kind != 'b') and not np.all((values == 0) | (values == 1))):
+        raise ValueError("Values must be true/false (or 0/1) to write as %s" % dtype.name)
+
+    return np.ascontiguousarray(values.astype(dtype))
+
+
+def parse_array(text, esper_type):
+    """Parse a JSON (or command line) array literal into a typed NumPy array
+
+    Numeric arrays are parsed by NumPy straight from the text, without building a
+    Python object per element. Anything NumPy can't read (booleans, nested arrays)
+    goes through the JSON decoder instead. Raises ValueError if it isn't an array
+    or its values don't fit the type (see cast_array).
+    """
+    import numpy as np
+
+    dtype = esper_dtype(esper_type)
+    text = text.strip()
+    if((text[:1] != '[') or (text[-1:] != ']')):
+        raise ValueError("Expected a [...] array")
+
+    inner = text[1:-1]
+    if(not inner.strip()):
+        return np.empty(0, dtype=dtype)
+
+    if(dtype.kind in 'iuf'):
+        try:
+            # Parsed wide, so cast_array sees what was actually typed
+            values = np.fromstring(inner, dtype=np.float64, sep=',')
+            # fromstring stops quietly at the first thing it can't parse
+            if(len(values) != inner.count(',') + 1):
+                values = None
+            # Past 2**53 doubles can't hold every 64 bit integer, leave those to the JSON decoder
+            elif((dtype.kind != 'f') and len(values) and (np.abs(values).max() >= 2 ** 53)):
+                values = None
+        except (ValueError, DeprecationWarning):
+            values = None
+        if(values is not None):
+            return cast_array(values, dtype)
+
+    return cast_array(json.loads(lenient_json(text)), dtype)
+
+
+def load_array(path, esper_type):
+    """Load a typed array to write from a .npy, .csv/.txt or JSON file
+
+    .npy files are memory mapped, so only the chunk being sent is ever read in when
+    no conversion is needed. CSV may have any number of values per line. Values are
+    checked to fit the type the same way parse_array does.
+    """
+    import numpy as np
+
+    dtype = esper_dtype(esper_type)
+    ext = os.path.splitext(path)[1].lower()
+    if(ext == '.npy'):
+        array = np.load(path, mmap_mode='r')
+    elif(ext in ('.csv', '.txt')):
+        if(dtype.kind == 'f'):
+            wide = np.float64
+        elif((dtype.kind == 'u') and (dtype.itemsize == 8)):
+            wide = np.uint64
+        else:
+            wide = np.int64
+        array = np.loadtxt(path, dtype=wide, delimiter=',', ndmin=1)
+    else:
+        with open(path, 'r') as f:
+            return parse_array(f.read(), esper_type)
+    return cast_array(array, dtype)
+
+
+def json_width(dtype):
+    """Most characters one element of dtype takes in a JSON array, separator included"""
+    import numpy as np
+
+    if(dtype.kind in 'iu'):
+        info = np.iinfo(dtype)
+        return max(len(str(info.min)), len(str(info.max))) + 1
+    if(dtype.kind == 'b'):
+        return len('false,')
+    return FLOAT_JSON_WIDTH
+
+
+def write_array(client, mid, vid, vinfo, array, offset=0, binary=False, window=1, retries=3, progress=None):
+    """Write a typed array to an ESPER variable in max_req_size chunks, starting at element offset
+
+    With binary set each chunk is the array's little endian bytes (binary=y), sent
+    straight from the array's buffer. Otherwise chunks are compact JSON, sized so
+    the text of even the widest elements fits in max_req_size. Either way only
+    window chunks are encoded at a time. progress(elements_done, elements) is
+    called after every chunk. Returns the number of requests made.
+    """
+    import numpy as np
+    from .compare import ESPER_TYPE_ASCII
+
+    if(vinfo['type'] == ESPER_TYPE_ASCII):
+        raise ValueError("ascii variables are written as strings, not arrays")
+
+    dtype = esper_dtype(vinfo['type'])
+    array = cast_array(array, dtype)
+    offset = int(offset)
+    if(offset + len(array) > vinfo['len']):
+        raise ValueError("%d element(s) at offset %d don't fit in %d" % (len(array), offset, vinfo['len']))
+    if(not len(array)):
+        return 0
+
+    if(binary):
+        element_progress = (lambda done, size: progress(done // dtype.itemsize, len(array))) if progress else None
+        return transfer.upload_from(client, mid, vid, array, vinfo['max_req_size'], window, retries, element_progress, dtype.itemsize, offset)
+
+    chunk = max(1, (vinfo['max_req_size'] - 2) // json_width(dtype))
+    done = [0, 0]
+
+    def send_chunk(start):
+        values = array[start:start + chunk]
+        payload = json.dumps(values.tolist(), separators=(',', ':'))
+        transfer.post_chunk(client, {'mid': mid, 'vid': vid, 'offset': offset + start}, payload, retries)
+        return len(values)
+
+    def chunk_done(start, length):
+        done[0] += length
+        done[1] += 1
+        if(progress):
+            progress(done[0], len(array))
+
+    transfer.run_windowed(range(0, len(array), chunk), send_chunk, window, chunk_done)
+    return done[1]
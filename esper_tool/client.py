@@ -0,0 +1,121 @@
+"""
+ESPER HTTP Client
+"""
+
+# Added for python2 compat
+from __future__ import (absolute_import, division, print_function, unicode_literals)
+
+import sys
+import time
+
+# Default number of keep-alive connections held open to a single node
+DEFAULT_POOL_SIZE = 10
+
+
+def normalize_url(url):
+    """Strip any trailing / and default to http:// if no scheme is given"""
+    # Strip trailing / off url
+    if(url[-1:] == '/'):
+        url = url[0:-1]
+
+    # if url is missing 'http', add it
+    if((url[0:7] != 'http://') and (url[0:8] != 'https://')):
+        url = 'http://' + url
+
+    return url
+
+
+class EsperError(Exception):
+    """ESPER service answered a request with an error response"""
+
+    def __init__(self, response):
+        self.status_code = response.status_code
+        self.content = response.content
+        try:
+            err = response.json()['error']
+            message = "Error %d: %s (%d)" % (err['status'], err['meaning'], err['code'])
+        except Exception:
+            message = "HTTP status " + str(response.status_code)
+        super(EsperError, self).__init__(message)
+
+
+class EsperClient(object):
+    """Pooled HTTP client for a single ESPER node
+
+    Holds one requests.Session per node so every read, write and transfer chunk
+    reuses an open keep-alive connection and the same auth header, instead of
+    paying a TCP handshake per request.
+
+    By default connection failures are reported and exit, like the rest of the
+    command line tool. With raise_errors set they are raised to the caller instead,
+    and callers may raise EsperError for error responses, so one node failing does
+    not take down a process talking to many. A deadline (time.time() value) bounds
+    the total time spent on the node; requests past it raise a Timeout.
+    """
+
+    def __init__(self, url, user=False, password=False, timeout=5, pool_size=DEFAULT_POOL_SIZE, raise_errors=False):
+        self.url = url
+        self.user = user
+        self.password = password
+        self.timeout = timeout
+        self.pool_size = int(pool_size)
+        self.raise_errors = raise_errors
+        self.deadline = None
+
+        # requests is imported here rather than with the module, commands routed
+        # through a running daemon never talk to a node directly and skip loading it
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.session = requests.Session()
+        if(user):
+            self.session.auth = (user, password)
+
+        # One host per client, so a single pool of up to pool_size connections.
+        # pool_block makes pool_size a hard per-host limit instead of letting extra
+        # connections be opened (and thrown away) when concurrent callers exceed it
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, pool_block=True)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def get(self, path, params):
+        """GET an ESPER endpoint, ie: get('/read_var', {'mid': 0, 'vid': 0})"""
+        return self.request('GET', path, params)
+
+    def post(self, path, params, payload):
+        """POST a payload to an ESPER endpoint, ie: post('/write_var', {'mid': 0, 'vid': 0}, '[1]')"""
+        return self.request('POST', path, params, payload)
+
+    def request(self, method, path, params, payload=None):
+        import requests
+
+        timeout = self.timeout
+        if(self.deadline is not None):
+            timeout = min(timeout, self.deadline - time.time())
+            if(timeout <= 0):
+                raise requests.exceptions.Timeout("Deadline exceeded for " + str(self.url))
+
+        if(self.raise_errors):
+            return self.session.request(method, self.url + path, params=params, data=payload, timeout=timeout)
+
+        try:
+            return self.session.request(method, self.url + path, params=params, data=payload, timeout=timeout)
+
+        except requests.exceptions.Timeout:
+            print("Timed out making request")
+            r = requests.Response()
+            r.status_code = 408
+            return r
+
+        except requests.exceptions.RequestException:
+            print("Unable to connect to " + str(self.url))
+            sys.exit(1)
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
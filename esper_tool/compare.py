@@ -0,0 +1,98 @@
+"""
+ESPER Variable Comparison
+"""
+
+# Added for python2 compat
+from __future__ import (absolute_import, division, print_function, unicode_literals)
+from builtins import str
+
+import numpy as np
+
+# NumPy dtype for each ESPER type. ascii (11) is compared as a string, null (0) and
+# raw (13) have no element type and fall back to whatever NumPy infers
+ESPER_DTYPES = {
+    1: np.uint8,
+    2: np.uint16,
+    3: np.uint32,
+    4: np.uint64,
+    5: np.int8,
+    6: np.int16,
+    7: np.int32,
+    8: np.int64,
+    9: np.float32,
+    10: np.float64,
+    12: np.bool_
+}
+
+ESPER_TYPE_ASCII = 11
+ESPER_FLOAT_TYPES = (9, 10)
+
+
+def typed_array(value, esper_type=None):
+    """Convert a JSON decoded ESPER value into a 1-d NumPy array of the variable's type"""
+    dtype = ESPER_DTYPES.get(esper_type)
+    if(dtype is not None):
+        try:
+            return np.atleast_1d(np.asarray(value, dtype=dtype))
+        except (ValueError, OverflowError, TypeError):
+            # Value doesn't fit the declared type (ie: -1 for a uint8), compare it as given
+            pass
+    return np.atleast_1d(np.asarray(value))
+
+
+def changed_elements(value, current_value, esper_type=None, rtol=0.0, atol=0.0):
+    """Return a boolean mask of the elements of value that differ from current_value, or None
+
+    None means the two can't be compared element by element (different lengths, or a
+    string) and should be treated as entirely changed. float32/float64 elements within
+    atol + rtol * abs(current) of each other are equal, as are NaNs in the same place.
+    """
+    if((esper_type == ESPER_TYPE_ASCII) or isinstance(value, str) or isinstance(current_value, str)):
+        return None
+
+    value = typed_array(value, esper_type)
+    current_value = typed_array(current_value, esper_type)
+    if(value.shape != current_value.shape):
+        return None
+
+    if((esper_type in ESPER_FLOAT_TYPES) or (value.dtype.kind == 'f') or (current_value.dtype.kind == 'f')):
+        try:
+            return ~np.isclose(value, current_value, rtol=rtol, atol=atol, equal_nan=True)
+        except TypeError:
+            pass
+    return value != current_value
+
+
+def mask_ranges(mask, merge_gap=0):
+    """Return (offset, length) of each run of True in mask
+
+    Runs separated by merge_gap or fewer False elements are merged into one.
+    """
+    changed = np.flatnonzero(mask)
+    if(len(changed) == 0):
+        return []
+
+    # Split wherever the gap to the next changed element is too large to bridge
+    breaks = np.flatnonzero(np.diff(changed) > (merge_gap + 1))
+    starts = np.concatenate(([changed[0]], changed[breaks + 1]))
+    ends = np.concatenate((changed[breaks], [changed[-1]]))
+    return [(int(start), int(end - start + 1)) for start, end in zip(starts, ends)]
+
+
+def compare_variable(value, current_value, esper_type=None, rtol=0.0, atol=0.0, merge_gap=0):
+    """Return the (offset, length) ranges where value differs from current_value
+
+    An empty list means the values are equal. Values that can't be compared element
+    by element come back as a single range covering all of value.
+    """
+    mask = changed_elements(value, current_value, esper_type, rtol, atol)
+    if(mask is None):
+        if(value == current_value):
+            return []
+        return [(0, len(value) if isinstance(value, list) else 1)]
+    return mask_ranges(mask, merge_gap)
+
+
+def format_ranges(ranges):
+    """Human readable element ranges, ie: '10-12, 500'"""
+    return ', '.join(str(offset) if length == 1 else '%d-%d' % (offset, offset + length - 1) for offset, length in ranges)
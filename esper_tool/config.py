@@ -0,0 +1,150 @@
+"""
+ESPER Node Configuration
+"""
+
+# Added for python2 compat
+from __future__ import (absolute_import, division, print_function, unicode_literals)
+
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from .client import EsperError
+
+# Modules describing the node itself rather than its configuration
+SYSTEM_MODULES = ("system", "storage", "build", "template")
+
+
+def get_configuration(client, jobs=1, metadata=None):
+    """Read every writable variable of every user module, reading up to jobs modules at once
+
+    If a metadata dict is given it is filled with each variable's 'type' and 'len', by
+    module, for type aware comparisons, and its numeric 'mid' and 'vid' for writes.
+    """
+    def get_module_variables(mid):
+        vars = dict()
+        var_info = dict()
+        querystring = {'mid': mid, 'includeVars': 'y', 'includeData': 'y'}
+        r = client.get('/read_module', querystring)
+        if(r.status_code == 200):
+            resp = r.json()
+            for i in range(0, len(resp['var'])):
+                # Only get variables that can be written to, and have data (ie: not Null)
+                if(resp['var'][i]['opt'] & 0x2) and (resp['var'][i]['d'] != None):
+                    vars[resp['var'][i]['key']] = resp['var'][i]['d']
+                    var_info[resp['var'][i]['key']] = {'type': resp['var'][i].get('type'), 'len': resp['var'][i].get('len'), 'mid': resp.get('id'), 'vid': resp['var'][i].get('id')}
+            if(metadata is not None):
+                metadata[mid] = var_info
+        elif(client.raise_errors):
+            raise EsperError(r)
+        else:
+            print("Error")
+        return vars
+
+    def get_modules():
+        querystring = {'includeMods': 'y'}
+        r = client.get('/read_node', querystring)
+        modules = []
+        if(r.status_code == 200):
+            resp = r.json()
+            for i in range(0, len(resp['module'])):
+                if(resp['module'][i]['key'] not in SYSTEM_MODULES):
+                    modules.append(resp['module'][i]['key'])
+        elif(client.raise_errors):
+            raise EsperError(r)
+        return modules
+
+    # Modules are crawled concurrently, but map() hands results back in module order
+    # so the config (and any file written from it) is always laid out the same way
+    config = dict()
+    modules = get_modules()
+    with ThreadPoolExecutor(max_workers=max(1, int(jobs))) as executor:
+        for module, module_vars in zip(modules, executor.map(get_module_variables, modules)):
+            config[module] = module_vars
+
+    final_config = dict()
+    for key in config:
+        if len(config[key]) > 0:
+            final_config[key] = config[key]
+
+    return final_config
+
+
+def compare_configuration(config, current_config, metadata=None, rtol=0.0, atol=0.0, merge_gap=0):
+    """Compare config against current_config using each variable's ESPER type when known
+
+    Returns {module: {var: [(offset, length), ...]}} holding the changed element
+    ranges of every variable that differs. float32/float64 variables are equal within
+    rtol/atol. Ranges separated by merge_gap or fewer unchanged elements are merged.
+    """
+    # Comparisons need numpy, get-config alone shouldn't pay for importing it
+    from .compare import compare_variable
+
+    metadata = metadata or dict()
+    changes = dict()
+    for module in config:
+        for var in config[module]:
+            esper_type = metadata.get(module, dict()).get(var, dict()).get('type')
+            ranges = compare_variable(config[module][var], current_config[module][var], esper_type, rtol, atol, merge_gap)
+            if(ranges):
+                changes.setdefault(module, dict())[var] = ranges
+    return changes
+
+
+def diff_configuration(config, current_config, metadata=None, rtol=0.0, atol=0.0):
+    """Return the variables of config whose value differs from current_config, by module"""
+    changes = compare_configuration(config, current_config, metadata, rtol, atol)
+    return dict((module, dict((var, config[module][var]) for var in changes[module])) for module in changes)
+
+
+def variable_writes(value, current_value, ranges):
+    """Return the (offset, payload) writes needed to turn current_value into value
+
+    Arrays of the same length only send the changed ranges, using write_var's offset
+    parameter. Anything else (scalars, strings, resized arrays) is written whole.
+    """
+    if(isinstance(value, list) and isinstance(current_value, list) and (len(value) == len(current_value)) and (len(value) > 1)):
+        return [(offset, json.dumps(value[offset:offset + length])) for offset, length in ranges]
+    return [(0, json.dumps(value))]
+
+
+def set_configuration(client, config, current_config, jobs=1, ordered=False, metadata=None, rtol=0.0, atol=0.0):
+    """Write every variable of config that differs from current_config
+
+    Up to jobs writes are in flight at once. With ordered set, the variables of each
+    module are written one after another in the order they appear in config (for
+    variables that depend on each other), while different modules still proceed
+    concurrently. Returns a list of (module, var, status_code) in config order, with
+    the first failing status if a variable needed more than one write. metadata, rtol
+    and atol are as for compare_configuration.
+    """
+    metadata = metadata or dict()
+    # Runs of up to 8 unchanged elements are rewritten rather than split into another request
+    delta_config = compare_configuration(config, current_config, metadata, rtol, atol, merge_gap=8)
+
+    def write_var(job):
+        module, var = job
+        # Address by numeric id when known, saves the node resolving keys on every write
+        info = metadata.get(module, dict()).get(var, dict())
+        mid = module if info.get('mid') is None else info['mid']
+        vid = var if info.get('vid') is None else info['vid']
+        for offset, payload in variable_writes(config[module][var], current_config[module][var], delta_config[module][var]):
+            querystring = {'mid': mid, 'vid': vid, 'offset': offset}
+            r = client.post('/write_var', querystring, payload)
+            if(r.status_code != 200):
+                return r.status_code
+        return 200
+
+    def write_module(module):
+        return [write_var((module, var)) for var in delta_config[module]]
+
+    results = []
+    with ThreadPoolExecutor(max_workers=max(1, int(jobs))) as executor:
+        if(ordered):
+            for module, status_codes in zip(delta_config, executor.map(write_module, delta_config)):
+                for var, status_code in zip(delta_config[module], status_codes):
+                    results.append((module, var, status_code))
+        else:
+            writes = [(module, var) for module in delta_config for var in delta_config[module]]
+            for (module, var), status_code in zip(writes, executor.map(write_var, writes)):
+                results.append((module, var, status_code))
+    return results
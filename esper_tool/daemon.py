@@ -0,0 +1,410 @@
+"""
+ESPER Tool Daemon
+"""
+
+# Added for python2 compat
+from __future__ import (absolute_import, division, print_function, unicode_literals)
+
+import os
+import sys
+import json
+import time
+import socket
+import struct
+import threading
+
+from .client import EsperClient, EsperError, DEFAULT_POOL_SIZE
+from .metadata import MetadataCache, DEFAULT_TTL
+from .version import __version__
+
+# Every message either way is FRAME (header length, body length), a JSON header and
+# a raw body. Request bodies are write payloads and response bodies the node's reply,
+# so binary transfer chunks pass through untouched.
+FRAME = struct.Struct('<II')
+
+# MetadataCache methods a daemon answers for its clients
+METADATA_METHODS = ('modules', 'module', 'variable', 'index', 'refresh')
+
+
+def default_socket_path():
+    """Socket the daemon listens on unless told otherwise, $ESPER_TOOL_SOCKET overrides it"""
+    path = os.environ.get('ESPER_TOOL_SOCKET')
+    if(path):
+        return path
+    runtime = os.environ.get('XDG_RUNTIME_DIR')
+    if(runtime and os.path.isdir(runtime)):
+        return os.path.join(runtime, 'esper-tool.sock')
+    return os.path.join(os.environ.get('TMPDIR', '/tmp'), 'esper-tool-%d.sock' % getattr(os, 'getuid', lambda: 0)())
+
+
+def send_frame(sock, header, body=b''):
+    header = json.dumps(header).encode('utf-8')
+    sock.sendall(FRAME.pack(len(header), len(body)) + header + body)
+
+
+def recv_exact(sock, length):
+    """Read exactly length bytes, None if the connection closed first"""
+    data = bytearray(length)
+    view = memoryview(data)
+    received = 0
+    while(received < length):
+        n = sock.recv_into(view[received:])
+        if(not n):
+            return None
+        received += n
+    return bytes(data)
+
+
+def recv_frame(sock):
+    """Read one message, returns (header, body) or None once the other end has closed"""
+    frame = recv_exact(sock, FRAME.size)
+    if(frame is None):
+        return None
+    header_length, body_length = FRAME.unpack(frame)
+    header = recv_exact(sock, header_length)
+    body = recv_exact(sock, body_length) if body_length else b''
+    if((header is None) or (body is None)):
+        return None
+    return (json.loads(header.decode('utf-8')), body)
+
+
+def open_socket(path):
+    """Connected socket to the daemon at path, None if there isn't one running
+
+    Sockets owned by another user are ignored, requests carry node credentials.
+    """
+    if(not hasattr(socket, 'AF_UNIX')):
+        return None
+    try:
+        if(os.stat(path).st_uid != os.getuid()):
+            return None
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    except (IOError, OSError):
+        return None
+    try:
+        sock.connect(path)
+    except (IOError, OSError):
+        sock.close()
+        return None
+    return sock
+
+
+class DaemonResponse(object):
+    """Status and body of a request made through the daemon, shaped like requests.Response"""
+
+    def __init__(self, status_code, content):
+        self.status_code = status_code
+        self.content = content
+
+    def json(self):
+        return json.loads(self.content.decode('utf-8'))
+
+
+class DaemonClient(object):
+    """EsperClient stand-in that makes its requests through a running daemon
+
+    The daemon holds the pooled keep-alive connection to the node, so the process
+    using this never opens one (or loads requests). Behaves like EsperClient does
+    for the command line: a timed out request returns a 408 response, and a node
+    or daemon that can't be reached is reported and exits. With raise_errors set all
+    of those raise IOError instead. Each thread gets its own connection to the
+    daemon, so concurrent transfers and watches still overlap.
+    """
+
+    def __init__(self, path, url, user=False, password=False, timeout=5, pool_size=DEFAULT_POOL_SIZE, sock=None):
+        self.path = path
+        self.url = url
+        self.user = user
+        self.password = password
+        self.timeout = timeout
+        self.pool_size = int(pool_size)
+        self.raise_errors = False
+        self.deadline = None
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.sockets = []
+        if(sock is not None):
+            self.local.sock = sock
+            self.sockets.append(sock)
+
+    def fail(self, message):
+        """Report a request that couldn't be made, and exit unless errors are raised"""
+        if(self.raise_errors):
+            raise IOError(message)
+        print(message)
+        sys.exit(1)
+
+    def connection(self):
+        sock = getattr(self.local, 'sock', None)
+        if(sock is None):
+            sock = open_socket(self.path)
+            if(sock is None):
+                self.fail("Unable to connect to esper-tool daemon at " + self.path)
+            self.local.sock = sock
+            with self.lock:
+                self.sockets.append(sock)
+        return sock
+
+    def call(self, header, body=b''):
+        """Send one message to the daemon and return its (header, body) reply"""
+        header['node'] = [self.url, self.user, self.password, self.timeout, self.pool_size]
+        sock = self.connection()
+        try:
+            send_frame(sock, header, body)
+            reply = recv_frame(sock)
+        except (IOError, OSError):
+            reply = None
+        if(reply is None):
+            # Only this thread's connection is gone, the next call opens another
+            with self.lock:
+                if(sock in self.sockets):
+                    self.sockets.remove(sock)
+            sock.close()
+            self.local.sock = None
+            self.fail("Lost connection to esper-tool daemon at " + self.path)
+
+        reply_header, reply_body = reply
+        error = reply_header.get('error')
+        if((error == 'timeout') and self.raise_errors):
+            raise IOError("Timed out making request")
+        elif(error == 'timeout'):
+            print("Timed out making request")
+        elif(error == 'connection'):
+            self.fail("Unable to connect to " + str(self.url))
+        elif(error == 'internal'):
+            self.fail("esper-tool daemon failed: " + reply_header['message'])
+        return (reply_header, reply_body)
+
+    def get(self, path, params):
+        """GET an ESPER endpoint, ie: get('/read_var', {'mid': 0, 'vid': 0})"""
+        return self.request('GET', path, params)
+
+    def post(self, path, params, payload):
+        """POST a payload to an ESPER endpoint, ie: post('/write_var', {'mid': 0, 'vid': 0}, '[1]')"""
+        return self.request('POST', path, params, payload)
+
+    def request(self, method, path, params, payload=None):
+        body = b''
+        if(payload is not None):
+            body = payload.encode('utf-8') if isinstance(payload, type('')) else bytes(payload)
+        header, body = self.call({'op': 'request', 'method': method, 'path': path, 'params': params, 'payload': payload is not None}, body)
+        if(header.get('error') == 'timeout'):
+            return DaemonResponse(408, b'')
+        return DaemonResponse(header['status'], body)
+
+    def close(self):
+        with self.lock:
+            for sock in self.sockets:
+                sock.close()
+            self.sockets = []
+        self.local = threading.local()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class DaemonMetadata(MetadataCache):
+    """MetadataCache whose lookups are answered from the daemon's cache
+
+    Descriptors outlive the process, so a script calling the tool over and over only
+    pays for looking a variable up the first time.
+    """
+
+    def __init__(self, client):
+        super(DaemonMetadata, self).__init__(None)
+        self.client = client
+
+    def lookup(self, client, method, *args):
+        header, body = client.call({'op': 'metadata', 'method': method, 'args': args})
+        if('error' in header):
+            # Same error the lookup raised in the daemon
+            raise EsperError(DaemonResponse(header.get('status', 408), body))
+        return json.loads(body.decode('utf-8'))
+
+    def modules(self, client):
+        return self.lookup(client, 'modules')
+
+    def module(self, client, mid):
+        return self.lookup(client, 'module', mid)
+
+    def variable(self, client, mid, vid):
+        return self.lookup(client, 'variable', mid, vid)
+
+    def index(self, client, jobs=1):
+        return self.lookup(client, 'index', jobs)
+
+    def refresh(self, url=None):
+        """Forget what the daemon has cached for a node, or every node if url is None"""
+        self.lookup(self.client, 'refresh', url)
+
+
+def connect(path, url, user=False, password=False, timeout=5, pool_size=DEFAULT_POOL_SIZE):
+    """DaemonClient for a node if a daemon is running at path, otherwise None"""
+    sock = open_socket(path)
+    if(sock is None):
+        return None
+    return DaemonClient(path, url, user, password, timeout, pool_size, sock)
+
+
+def call_daemon(path, op):
+    """Send a bare control message (ie: 'status', 'stop'), None if no daemon is running"""
+    sock = open_socket(path)
+    if(sock is None):
+        return None
+    try:
+        send_frame(sock, {'op': op})
+        reply = recv_frame(sock)
+    except (IOError, OSError):
+        reply = None
+    finally:
+        sock.close()
+    return reply[0] if reply else None
+
+
+class Daemon(object):
+    """Serve requests for many short lived esper-tool processes from one long lived one
+
+    Keeps an EsperClient (and so a pool of keep-alive connections) per node, keyed
+    by URL, credentials, timeout and pool size, plus one MetadataCache shared by
+    everyone. Clients connect to a Unix socket only its owner can use, and each
+    connection is served by its own thread.
+    """
+
+    def __init__(self, path, ttl=DEFAULT_TTL, cache=None):
+        self.path = path
+        self.metadata = MetadataCache(ttl, cache)
+        self.clients = dict()
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.requests = 0
+        self.server = None
+
+    def client(self, node):
+        key = tuple(node)
+        with self.lock:
+            client = self.clients.get(key)
+            if(client is None):
+                url, user, password, timeout, pool_size = node
+                client = EsperClient(url, user, password, float(timeout), pool_size, raise_errors=True)
+                self.clients[key] = client
+            return client
+
+    def handle(self, header, body):
+        """Answer one message, returns the (header, body) reply"""
+        import requests
+
+        op = header.get('op')
+        if(op == 'status'):
+            with self.lock:
+                nodes = sorted(set(key[0] for key in self.clients))
+            return ({'pid': os.getpid(), 'version': __version__, 'uptime': time.time() - self.started, 'requests': self.requests, 'nodes': nodes}, b'')
+        elif(op == 'stop'):
+            threading.Thread(target=self.server.shutdown).start()
+            return ({'pid': os.getpid()}, b'')
+
+        with self.lock:
+            self.requests += 1
+        client = self.client(header['node'])
+        try:
+            if(op == 'request'):
+                r = client.request(header['method'], header['path'], header['params'], body if header['payload'] else None)
+                return ({'status': r.status_code}, r.content)
+
+            elif((op == 'metadata') and (header.get('method') in METADATA_METHODS)):
+                args = header.get('args', [])
+                if(header['method'] == 'refresh'):
+                    self.metadata.refresh(*args)
+                    result = None
+                else:
+                    result = getattr(self.metadata, header['method'])(client, *args)
+                # Entries can gain variables while being encoded, the cache changes them under its lock
+                with self.metadata.lock:
+                    return ({'status': 200}, json.dumps(result).encode('utf-8'))
+
+            return ({'error': 'internal', 'message': 'Unknown request ' + str(op)}, b'')
+
+        except EsperError as e:
+            return ({'error': 'esper', 'status': e.status_code}, e.content or b'')
+        except requests.exceptions.Timeout:
+            return ({'error': 'timeout'}, b'')
+        except requests.exceptions.RequestException as e:
+            return ({'error': 'connection', 'message': str(e)}, b'')
+        except Exception as e:
+            return ({'error': 'internal', 'message': repr(e)}, b'')
+
+    def bind(self):
+        """Start listening, replacing a socket left behind by a daemon that didn't exit cleanly"""
+        import socketserver
+
+        daemon = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                while(True):
+                    try:
+                        message = recv_frame(self.request)
+                    except (IOError, OSError):
+                        break
+                    if(message is None):
+                        break
+                    try:
+                        send_frame(self.request, *daemon.handle(*message))
+                    except (IOError, OSError):
+                        break
+
+        class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+            daemon_threads = True
+
+        if(os.path.exists(self.path)):
+            if(call_daemon(self.path, 'status') is not None):
+                raise OSError("A daemon is already running at " + self.path)
+            os.unlink(self.path)
+
+        # Requests carry node credentials, so only this user may connect
+        umask = os.umask(0o177)
+        try:
+            self.server = Server(self.path, Handler)
+        finally:
+            os.umask(umask)
+
+    def serve(self):
+        """Serve until stopped, then remove the socket and close every node's connections"""
+        import signal
+
+        # Let SIGTERM clean up the same way a stop request does
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        try:
+            self.server.serve_forever()
+        finally:
+            self.server.server_close()
+            try:
+                os.unlink(self.path)
+            except (IOError, OSError):
+                pass
+            with self.lock:
+                for client in self.clients.values():
+                    client.close()
+            self.metadata.save()
+
+    def detach(self):
+        """Fork a background process to serve from, returns its pid
+
+        The socket is already listening when this returns, so commands run straight
+        after it are served rather than racing the daemon's startup.
+        """
+        pid = os.fork()
+        if(pid):
+            self.server.socket.close()
+            return pid
+
+        os.setsid()
+        devnull = os.open(os.devnull, os.O_RDWR)
+        for fd in (0, 1, 2):
+            os.dup2(devnull, fd)
+        try:
+            self.serve()
+        finally:
+            os._exit(0)
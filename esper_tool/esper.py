@@ -11,8 +11,110 @@ import random
 import struct
 import socket
 import time
+from collections import namedtuple
 
 ESPER_API_VERSION = 2
+ESPER_DISCOVERY_PORT = 27500
+
+# Seconds between discovery request rounds
+DISCOVERY_INTERVAL = 0.25
+
+# Discovery packets, compiled once. Requests are the UDP header (ident, api version,
+# udp version, category, type, message id, auth token) followed by the filters
+DISCOVERY_REQUEST = struct.Struct("<4sBBBBI8sBBIB64sB64sB32sB128s")
+DISCOVERY_RESPONSE = struct.Struct("<BBI64s64s32s128sIxxxxxxxxxxxxIH64s")
+# Responses start after the 4 byte ident
+DISCOVERY_RESPONSE_OFFSET = 4
+IPV4_ADDRESS = struct.Struct("!I")
+
+# Padding stripped from the fixed width text fields of a response
+TEXT_PADDING = b' \t\r\n\0'
+
+EsperDevice = namedtuple('EsperDevice', ['api_version', 'udp_version', 'module_id', 'name', 'type', 'revision', 'hardware_id', 'uptime', 'ip', 'port', 'url'])
+
+
+def parse_discovery_response(fields):
+    """EsperDevice for the unpacked DISCOVERY_RESPONSE fields of a response"""
+    return EsperDevice(
+        fields[0],
+        fields[1],
+        fields[2],
+        fields[3].rstrip(TEXT_PADDING).decode("ascii"),
+        fields[4].rstrip(TEXT_PADDING).decode("ascii"),
+        fields[5].rstrip(TEXT_PADDING).decode("ascii"),
+        fields[6].rstrip(TEXT_PADDING).decode("ascii"),
+        fields[7],
+        socket.inet_ntoa(IPV4_ADDRESS.pack(fields[8])),
+        fields[9],
+        fields[10].rstrip(TEXT_PADDING).decode("ascii")
+    )
+
+# Linux ioctls for an interface's IPv4 address and netmask
+SIOCGIFADDR = 0x8915
+SIOCGIFNETMASK = 0x891b
+
+
+def local_broadcast_addresses():
+    """Directed broadcast address of every local IPv4 interface, except loopback
+
+    Interfaces are listed with ioctls, so this only works on Linux. Elsewhere it
+    returns an empty list, and discovery falls back to the default interface.
+    """
+    try:
+        import fcntl
+        names = [name for index, name in socket.if_nameindex()]
+    except (ImportError, AttributeError, OSError):
+        return []
+
+    addresses = []
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        for name in names:
+            ifreq = struct.pack('256s', name.encode('ascii')[:15])
+            try:
+                address = socket.inet_ntoa(fcntl.ioctl(sock.fileno(), SIOCGIFADDR, ifreq)[20:24])
+                netmask = socket.inet_ntoa(fcntl.ioctl(sock.fileno(), SIOCGIFNETMASK, ifreq)[20:24])
+            except (IOError, OSError):
+                # Interface is down or has no IPv4 address
+                continue
+            network = ipaddress.IPv4Network(str(address + '/' + netmask), strict=False)
+            # Point to point links have no broadcast address
+            if(network.is_loopback or (network.prefixlen >= 31)):
+                continue
+            if(str(network.broadcast_address) not in addresses):
+                addresses.append(str(network.broadcast_address))
+    finally:
+        sock.close()
+    return addresses
+
+
+def discovery_targets(targets=None):
+    """Addresses to send discovery requests to
+
+    Each target may be a subnet (ie: '10.1.0.0/16'), which gets its directed
+    broadcast address, or a single address or hostname, which is sent to directly.
+    Without targets, every local interface is covered: the limited broadcast for the
+    default interface plus the directed broadcast of every other one. Raises
+    ValueError for a malformed subnet or a hostname that doesn't resolve.
+    """
+    if(not targets):
+        return ['<broadcast>'] + local_broadcast_addresses()
+
+    addresses = []
+    for target in targets:
+        try:
+            if('/' in target):
+                address = str(ipaddress.IPv4Network(str(target), strict=False).broadcast_address)
+            else:
+                address = socket.gethostbyname(target)
+        except ValueError as e:
+            raise ValueError("Invalid discovery target '%s': %s" % (target, e))
+        except (IOError, OSError):
+            raise ValueError("Unable to resolve discovery target '%s'" % target)
+        if(address not in addresses):
+            addresses.append(address)
+    return addresses
+
 
 class EsperUDP:
     """ESPER UDP Protocol"""
@@ -28,8 +130,26 @@ class EsperUDP:
         self.__socket.bind((socket.INADDR_ANY, 0))
         self.__auth_token = authToken
 
-    def send_discovery(self, deviceId, deviceName, deviceType, deviceRev, hardwareId, authToken, timeout=3, verbose=False):
+    def send_discovery(self, deviceId, deviceName, deviceType, deviceRev, hardwareId, authToken, timeout=3, verbose=False, rounds=1, count=0, targets=None):
         """Send a discovery packet and gather responses"""
+        response_list = []
+        for response in self.discover(deviceId, deviceName, deviceType, deviceRev, hardwareId, authToken, timeout, rounds, count, targets):
+            response_list.append(response)
+            if(verbose):
+                print(response)
+        return response_list
+
+    def discover(self, deviceId=None, deviceName="", deviceType="", deviceRev="", hardwareId="", authToken="", timeout=3, rounds=3, count=0, targets=None, interval=DISCOVERY_INTERVAL):
+        """Broadcast discovery requests and yield each device as it answers
+
+        The request is sent rounds times, interval seconds apart, so a device whose
+        request or response was lost still gets found. Each round goes to every
+        address from discovery_targets(targets), all from one socket, so every
+        network is scanned within the same timeout. Devices answering more than once
+        (ie: to several rounds, or on several networks) are only yielded the first
+        time, by module id and hardware id. Stops after timeout seconds, or as soon
+        as count devices have answered if count is given.
+        """
         msg = self.__build_discovery_request(
             deviceId,
             deviceName,
@@ -38,53 +158,51 @@ class EsperUDP:
             hardwareId,
             authToken
         )
+        addresses = discovery_targets(targets)
         client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
         client.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-        client.sendto(msg, ('<broadcast>', 27500))
-        # Wait for response(s)
-        timeout = timeout
-        timeout_start = time.time()
-        timeout_end = timeout_start + timeout
-        response_list = []
-        while time.time() < timeout_end:
-            time_left = timeout_end - time.time()
-            if(time_left <= 0):
-                time_left = 0.01
-            client.settimeout(time_left)
-            try:
-                data, server = client.recvfrom(1500)
-                response = self.__parse_discovery_response(data[4:])
-                if(response is not None):
-                    response_list.append(response)
-                    if(verbose):
-                        print(response)
-            except socket.timeout:
-                # This is expected to occur, eventually all devices will have responded
-                pass
-
-        client.close()
-        return response_list
 
-    def __parse_discovery_response(self, data):
-        """Receive Response, and parse it back into a python dict"""
+        # Every response is received into the same buffer and unpacked in place
+        buffer = bytearray(1500)
+        seen = set()
+        timeout_end = time.time() + timeout
+        next_round = time.time()
+        sent = 0
         try:
-            unpacked_data = struct.unpack("<BBI64s64s32s128sIxxxxxxxxxxxxIH64s", data)
-            response = dict()
-            response['api_version'] = unpacked_data[0]
-            response['udp_version'] = unpacked_data[1]
-            response['module_id'] = unpacked_data[2]
-            response['name'] = unpacked_data[3].decode("ascii").rstrip(' \t\r\n\0')
-            response['type'] = unpacked_data[4].decode("ascii").rstrip(' \t\r\n\0')
-            response['revision'] = unpacked_data[5].decode("ascii").rstrip(' \t\r\n\0')
-            response['hardware_id'] = unpacked_data[6].decode("ascii").rstrip(' \t\r\n\0')
-            response['uptime'] = unpacked_data[7]
-            response['ip'] = str(ipaddress.ip_address(unpacked_data[8]))
-            response['port'] = unpacked_data[9]
-            response['url'] = unpacked_data[10].decode("ascii").rstrip(' \t\r\n\0')
-        except struct.error:
-            response = None
-
-        return response
+            while time.time() < timeout_end:
+                if((sent < rounds) and (time.time() >= next_round)):
+                    for address in addresses:
+                        try:
+                            client.sendto(msg, (address, ESPER_DISCOVERY_PORT))
+                        except (IOError, OSError):
+                            # Unreachable network, the others may still answer
+                            pass
+                    sent += 1
+                    next_round += interval
+
+                # Wake up for the next round, or the end of the timeout once all are sent
+                wake = next_round if sent < rounds else timeout_end
+                client.settimeout(max(0.01, min(wake, timeout_end) - time.time()))
+                try:
+                    length, server = client.recvfrom_into(buffer)
+                except socket.timeout:
+                    # This is expected to occur, eventually all devices will have responded
+                    continue
+
+                if(length < DISCOVERY_RESPONSE_OFFSET + DISCOVERY_RESPONSE.size):
+                    continue
+                fields = DISCOVERY_RESPONSE.unpack_from(buffer, DISCOVERY_RESPONSE_OFFSET)
+                # Repeat answers are dropped before any of their text is decoded
+                device = (fields[2], fields[6])
+                if(device in seen):
+                    continue
+                seen.add(device)
+                yield parse_discovery_response(fields)
+
+                if(count and (len(seen) >= count)):
+                    return
+        finally:
+            client.close()
 
     def __build_discovery_request(self, deviceId=None, deviceName="", deviceType="", deviceRev="", hardwareId="", authToken=""):
         """Build a discovery request packet to be sent, that looks for device(s) that match the given filter values"""
@@ -115,20 +233,15 @@ class EsperUDP:
             use_device_id = 0x00
             deviceId = int(0)
 
-        # Build ESPER UDP request header
-        request_header = struct.pack(
-            "<4sBBBBI8s",
+        # ESPER UDP request header, then the payload
+        return DISCOVERY_REQUEST.pack(
             "ESPR".encode("ascii"),  # ESPER Ident
             ESPER_API_VERSION,
             EsperUDP.ESPER_UDP_VERSION,
             0,  # CATEGORY (CAT_DISCOVERY)
             0,  # TYPE (DISCOVERY_REQUEST
             random.randint(0, 4294967295),  # MESSAGE ID
-            authToken.encode("ascii")
-        )
-
-        request_payload = struct.pack(
-            "<BBIB64sB64sB32sB128s",
+            authToken.encode("ascii"),
             0,
             use_device_id,
             deviceId,
@@ -140,5 +253,3 @@ class EsperUDP:
             deviceRev.encode("ascii"),
             use_hardware_id,
             hardwareId.encode("ascii"))
-
-        return request_header + request_payload
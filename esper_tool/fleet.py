@@ -0,0 +1,77 @@
+"""
+ESPER Fleet Operations
+"""
+
+# Added for python2 compat
+from __future__ import (absolute_import, division, print_function, unicode_literals)
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .client import EsperClient, DEFAULT_POOL_SIZE, normalize_url
+from .config import get_configuration, diff_configuration, set_configuration
+
+FLEET_ACTIONS = ('get-config', 'diff', 'set-config')
+
+
+def discovered_urls(devices):
+    """Node URLs for the devices found by EsperUDP.discover()"""
+    return ['http://%s:%d' % (device.ip, device.port) for device in devices]
+
+
+def run_node(url, action, config=None, user=False, password=False, timeout=5, pool_size=DEFAULT_POOL_SIZE, jobs=1, node_timeout=None, ordered=False, rtol=0.0, atol=0.0):
+    """Run one fleet action against a single node, never raising
+
+    Returns {'status': 'ok', 'result': ...} or {'status': 'error', 'error': message}.
+    get-config results are the node's configuration, diff results the variables of
+    config that differ on the node, and set-config results the writes made.
+    """
+    client = EsperClient(url, user, password, timeout, pool_size, raise_errors=True)
+    if(node_timeout):
+        client.deadline = time.time() + node_timeout
+
+    try:
+        metadata = dict()
+        current_config = get_configuration(client, jobs, metadata)
+        if(action == 'get-config'):
+            result = current_config
+        elif(action == 'diff'):
+            result = diff_configuration(config, current_config, metadata, rtol, atol)
+        else:
+            result = {'written': [], 'failed': []}
+            for module, var, status_code in set_configuration(client, config, current_config, jobs, ordered, metadata, rtol, atol):
+                if(status_code == 200):
+                    result['written'].append(module + '/' + var)
+                else:
+                    result['failed'].append({'var': module + '/' + var, 'status': status_code})
+            if(result['failed']):
+                return {'status': 'error', 'error': 'Failed writing %d variable(s)' % len(result['failed']), 'result': result}
+        return {'status': 'ok', 'result': result}
+
+    except Exception as e:
+        # One bad node must not stop the rest of the fleet
+        return {'status': 'error', 'error': "%s: %s" % (type(e).__name__, e)}
+
+    finally:
+        client.close()
+
+
+def run_fleet(urls, action, config=None, user=False, password=False, timeout=5, pool_size=DEFAULT_POOL_SIZE, jobs=1, concurrency=8, node_timeout=None, ordered=False, rtol=0.0, atol=0.0):
+    """Run a fleet action against every node in urls, up to concurrency nodes at once
+
+    Returns the consolidated result, {'action': action, 'nodes': {url: node result}},
+    with nodes listed in the order given.
+    """
+    urls = [normalize_url(url) for url in urls]
+    # Same node listed twice (ie: given and discovered) is only visited once
+    urls = sorted(set(urls), key=urls.index)
+
+    def run(url):
+        return run_node(url, action, config, user, password, timeout, pool_size, jobs, node_timeout, ordered, rtol, atol)
+
+    nodes = dict()
+    with ThreadPoolExecutor(max_workers=max(1, int(concurrency))) as executor:
+        for url, result in zip(urls, executor.map(run, urls)):
+            nodes[url] = result
+
+    return {'action': action, 'nodes': nodes}
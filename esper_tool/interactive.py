@@ -0,0 +1,702 @@
+"""
+ESPER Interactive Shell
+"""
+
+# Added for python2 compat
+from __future__ import (absolute_import, division, print_function, unicode_literals)
+
+import os
+import sys
+import requests
+import cmd
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+from . import transfer
+from . import monitor
+from . import binary
+from .transfer import progress_bar
+from .varspec import parse_var_spec
+from .multiread import read_var_specs, is_pattern, format_document
+from .client import EsperError
+from .version import __version__
+
+
+class Esper(object):
+    ESPER_TYPE_NULL = 0
+    ESPER_TYPE_ASCII = 11
+
+    def getTypeString(self, esper_type):
+        options = {
+            0: "null",
+            1: "uint8",
+            2: "uint16",
+            3: "uint32",
+            4: "uint64",
+            5: "sint8",
+            6: "sint16",
+            7: "sint32",
+            8: "sint64",
+            9: "float32",
+            10: "float64",
+            11: "ascii",
+            12: "bool",
+            13: "raw"
+        }
+        return options.get(esper_type, "unknown")
+
+    def getOptionString(self, esper_option):
+        retStr = ""
+        if(esper_option & 0x01):
+            retStr = retStr + "R"
+        else:
+            retStr = retStr + " "
+
+        if(esper_option & 0x02):
+            retStr = retStr + "W"
+        else:
+            retStr = retStr + " "
+
+        if(esper_option & 0x04):
+            retStr = retStr + "H"
+        else:
+            retStr = retStr + " "
+
+        if(esper_option & 0x08):
+            retStr = retStr + "S"
+        else:
+            retStr = retStr + " "
+
+        if(esper_option & 0x10):
+            retStr = retStr + "L"
+        else:
+            retStr = retStr + " "
+
+        if(esper_option & 0x20):
+            retStr = retStr + "W"
+        else:
+            retStr = retStr + " "
+
+        return retStr
+
+    def getStatusString(self, esper_status):
+        retStr = ""
+        if(esper_status & 0x01):
+            retStr = retStr + "L"
+        else:
+            retStr = retStr + " "
+
+        if(esper_status & 0x02):
+            retStr = retStr + "S"
+        else:
+            retStr = retStr + " "
+
+        if(esper_status & 0x04):
+            retStr = retStr + "D"
+        else:
+            retStr = retStr + " "
+
+        return retStr
+
+
+def pretty_time_delta(seconds):
+    seconds = int(seconds)
+    days, seconds = divmod(seconds, 86400)
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    if days > 0:
+        return '%dd %dh %dm %ds' % (days, hours, minutes, seconds)
+    elif hours > 0:
+        return '0d %dh %dm %ds' % (hours, minutes, seconds)
+    elif minutes > 0:
+        return '0d 0h %dm %ds' % (minutes, seconds)
+    else:
+        return '0d 0h 0m %ds' % (seconds)
+
+
+class InteractiveMode(cmd.Cmd):
+    """Interactive Mode"""
+
+    def emptyline(self):
+        pass
+
+    def do_timeout(self, line):
+        """Purpose: Adjust HTTP request timeout length\nUsage: timeout <seconds>\nExample: timeout 0.5\n"""
+        line_args = str.split(line, ' ')
+        if(line_args[0] == ''):
+            print("Current timeout period is " + str(self.client.timeout))
+        else:
+            self.client.timeout = float(line_args[0])
+            print("Timeout period is now " + str(self.client.timeout))
+
+    def do_window(self, line):
+        """Purpose: Adjust number of upload/download chunks kept in flight. Use 1 for flash (EPCQ) backed variables\nUsage: window <chunks>\nExample: window 4\n"""
+        line_args = str.split(line, ' ')
+        if(line_args[0] == ''):
+            print("Current transfer window is " + str(self.window))
+        else:
+            self.window = max(1, int(line_args[0]))
+            print("Transfer window is now " + str(self.window))
+
+    def do_rate(self, line):
+        """Purpose: Adjust how many times per second 'read <vid> repeat' and 'watch' sample\nUsage: rate <hz>\nExample: rate 10\n"""
+        line_args = str.split(line, ' ')
+        if(line_args[0] == ''):
+            print("Current sample rate is " + str(self.rate) + " Hz")
+        else:
+            try:
+                self.rate = monitor.parse_rate(line_args[0])
+            except ValueError as e:
+                print(e)
+                return
+            print("Sample rate is now " + str(self.rate) + " Hz")
+
+    def print_esper_error(self, err_json):
+        try:
+            print("Error %d: %s (%d)" % (err_json['error']['status'], err_json['error']['meaning'], err_json['error']['code']))
+        except:
+            print("Unknown Error Format")
+
+    def get_module_variables(self):
+        self.var_completion = []
+        try:
+            for var in self.metadata.module(self.client, self.module)['var']:
+                self.var_completion.append(var['key'])
+        except EsperError:
+            pass
+
+    def get_modules(self):
+        self.mod_completion = []
+        try:
+            for module in self.metadata.modules(self.client):
+                self.mod_completion.append(module['key'])
+        except EsperError:
+            pass
+
+    def do_refresh(self, line):
+        """Purpose: Forget cached module/variable metadata and fetch it again from the node\nUsage: refresh\n"""
+        self.metadata.refresh(self.client.url)
+        self.get_modules()
+        self.get_module_variables()
+        print("Metadata refreshed")
+
+    def do_version(self, line):
+        """Purpose: Prints current version of esper-tool\nUsage: version\n"""
+        print(self.prog + ' ' + __version__)
+
+    def do_uptime(self, line):
+        """Purpose: Get uptime of current ESPER service\nUsage: uptime\n"""
+        querystring = {'mid': 'system', 'vid': 'uptime', 'dataOnly': 'y'}
+        try:
+            r = self.client.get('/read_var', querystring)
+            if(r.status_code == 200):
+                print('Uptime: ' + pretty_time_delta(r.json()[0]))
+            elif(r):
+                self.print_esper_error(r.json())
+
+        except requests.exceptions.RequestException as e:
+            print("Error: {}".format(e))
+
+    def do_list(self, line):
+        """Purpose: Lists available modules\nUsage: list\n"""
+        try:
+            modules = self.metadata.modules(self.client)
+            print('%-5s %-16s %-32s' % ('mid', 'key', 'name'))
+            print('%-5s %-16s %-32s' % ('---', '---', '----'))
+            for module in modules:
+                print('%-5s %-16s %-32s' % (str(module['id']), module['key'], module['name']))
+
+        except EsperError as e:
+            print(e)
+
+        except requests.exceptions.RequestException as e:
+            print("Error: {}".format(e))
+
+    def complete_cd(self, content, line, begidx, endidx):
+        if content:
+            return [
+                module for module in self.mod_completion
+                if module.startswith(content)
+            ]
+        else:
+            return self.mod_completion
+
+    def do_cd(self, line):
+        """Purpose: Sets current module\nUsage: cd <mid>\n"""
+        self.do_module(line)
+
+    def complete_module(self, content, line, begidx, endidx):
+        if content:
+            return [
+                module for module in self.mod_completion
+                if module.startswith(content)
+            ]
+        else:
+            return self.mod_completion
+
+    def do_module(self, line):
+        """Purpose: Sets current module\nUsage: module <mid>\n"""
+        if(line):
+            line_args = str.split(line)
+            # remove starting / if it exists
+            if(line_args[0][0] == '/'):
+                line_args[0] = line_args[0][1:]
+
+            try:
+                self.module = self.metadata.module(self.client, line_args[0])['key']
+                self.get_module_variables()
+                self.prompt = '[' + self.url + ':/' + self.module + ']> '
+            except EsperError as e:
+                print(e)
+        else:
+            print("Please select a module")
+            self.do_list("")
+
+    def complete_write(self, content, line, begidx, endidx):
+        if content:
+            return [
+                variable for variable in self.var_completion
+                if variable.startswith(content)
+            ]
+        else:
+            return self.var_completion
+
+    def do_write(self, line):
+        """Purpose: Write module variable\nUsage: write <vid> <data> [offset] [all]\n"""
+        try:
+            line_args = str.split(line, ' ')
+            if(not line):
+                print("Missing variable to write to\nwrite <vid> <data>")
+                return
+
+            vid = line_args[0].lower()
+            offset = 0
+
+            if((len(line_args) < 2) or (line_args[1] == '')):
+                print("Missing data to write to %s \nwrite %s <data>" % (vid, vid))
+                return
+
+            # If passing an array, there may be spaces between comma separated values, wrecking the initial argument 'split'
+            # Lets fix it up!
+            if(line_args[1][0] == '['):
+                line_args[1] = re.search(r'\[(.*)\]', line).group(1)
+                line_args = line_args[0:2] + str.split(line[str.find(line, ']') + 1:], ' ')[1:]
+
+            # Lets make all payloads an array to conform to the obsolete RFC4627... makes later steps easier if everything is array
+            # Allow any capitalization of booleans and 'single quoted' strings
+            payload = binary.lenient_json('[' + line_args[1] + ']')
+
+            write_all = False
+            if(len(line_args) > 2):
+                # Offset or 'all' check
+                if(line_args[2].lower() == 'all'):
+                    write_all = True
+                else:
+                    offset = int(line_args[2])
+
+            resp = None
+            if(write_all or (len(payload) > binary.SINGLE_WRITE_LIMIT)):
+                # Need the variables type and total length
+                try:
+                    resp = self.metadata.variable(self.client, self.module, vid)
+                    mid, vid_id = self.metadata.resolve(self.client, self.module, vid)
+                except EsperError as e:
+                    print("Error retrieving length of variable" if write_all else e)
+                    return
+
+            # Numeric arrays too big for one request, or filling the whole variable, are parsed
+            # straight into a typed array and sent in max_req_size chunks
+            if((resp is not None) and (resp['type'] != Esper.ESPER_TYPE_ASCII)):
+                try:
+                    array = binary.parse_array(payload, resp['type'])
+                    if(write_all):
+                        if(len(array) > 1):
+                            print("Data must be single element to use 'all' attribute")
+                            return
+                        array = array.repeat(resp['len'])
+                    binary.write_array(self.client, mid, vid_id, resp, array, offset, False, self.window)
+                except (ValueError, transfer.TransferError) as e:
+                    print("Failed to write " + vid + ": " + str(e))
+                return
+
+            # Convert payload from JSON to python dict
+            try:
+                payload_dict = json.loads(payload)
+            except:
+                print("Data is not valid JSON")
+                return
+
+            if(write_all):
+                if(len(payload_dict) > 1):
+                    print("Data must be single element to use 'all' attribute")
+                    return
+                # Generate new JSON payload that is an array containing as many elements as the variable can take
+                payload_dict = payload_dict * resp['len']
+
+            # Convert payload back to JSON back so we send conformal JSON requests
+            payload = json.dumps(payload_dict)
+
+            querystring = {'mid': self.module, 'vid': vid, 'offset': offset}
+            r = self.client.post('/write_var', querystring, payload)
+
+            if(r.status_code != 200):
+                if(r):
+                    self.print_esper_error(r.json())
+        except:
+            print("Invalid Arguments")
+
+    def complete_wr(self, content, line, begidx, endidx):
+        if content:
+            return [
+                variable for variable in self.var_completion
+                if variable.startswith(content)
+            ]
+        else:
+            return self.var_completion
+
+    def do_wr(self, line):
+        self.do_write(line)
+
+    def complete_ls(self, content, line, begidx, endidx):
+        if content:
+            return [
+                variable for variable in self.var_completion
+                if variable.startswith(content)
+            ]
+        else:
+            return self.var_completion
+
+    def do_ls(self, line):
+        """Purpose: Read module variable(s)\nUsage: ls <vid> [offset] [length] [repeat]\n       ls <vid|mid/vid>[offset:len] [<vid|mid/vid>[offset:len] ...]\n"""
+        self.do_read(line)
+
+    def do_rd(self, line):
+        """Purpose: Read module variable(s)\nUsage: rd <vid> [offset] [length] [repeat]\n       rd <vid|mid/vid>[offset:len] [<vid|mid/vid>[offset:len] ...]\n"""
+        self.do_read(line)
+
+    def complete_rd(self, content, line, begidx, endidx):
+        if content:
+            return [
+                variable for variable in self.var_completion
+                if variable.startswith(content)
+            ]
+        else:
+            return self.var_completion
+
+
+    def complete_read(self, content, line, begidx, endidx):
+        if content:
+            return [
+                variable for variable in self.var_completion
+                if variable.startswith(content)
+            ]
+        else:
+            return self.var_completion
+
+    def do_read(self, line):
+        """Purpose: Read module variable(s)\nUsage: read <vid> [offset] [length] [repeat]\n       read <vid|mid/vid>[offset:len] [<vid|mid/vid>[offset:len] ...]\n\nThe second form reads every variable given at once, * and ? match keys (ie: 'adc/ch*')\n"""
+        try:
+            if(line and self.is_multi_read(line.split())):
+                self.read_many(line.split())
+            elif(line):
+                start = line.find('[')
+                mid = line.find(':')
+                end = line.find(']')
+
+                # We do this to ensure the str.split() works as expected to break up
+                if(start != -1):
+                    if(line[start - 1] != ' '):
+                        line = line[0:start] + ' ' + line[start:]
+
+                line_args = str.split(line, ' ')
+                vid = line_args[0].lower()
+                offset = 0
+                length = 0
+                repeat = False
+
+                if(len(line_args) > 1):
+                    if((line_args[1].lower() == 'r') or (line_args[1].lower() == 'repeat')):
+                        repeat = True
+                    else:
+                        try:
+                            start = line_args[1].find('[')
+                            mid = line_args[1].find(':')
+                            end = line_args[1].find(']')
+                            if(start != -1):
+                                if(mid != -1):
+                                    offset = int(line_args[1][start + 1:mid])
+                                    length = int(line_args[1][end - 1:mid + 2]) - offset + 1
+                                else:
+                                    offset = int(line_args[1][start + 1:end])
+                                    length = 1
+                            else:
+                                offset = int(line_args[1])
+                        except:
+                            offset = 0
+                            length = 0
+                            repeat = False
+
+                    if(len(line_args) > 2):
+                        if((line_args[2].lower() == 'r') or (line_args[2].lower() == 'repeat')):
+                            repeat = True
+                        else:
+                            length = int(line_args[2])
+
+                    if(len(line_args) > 3):
+                        if((line_args[3].lower() == 'r') or (line_args[3].lower() == 'repeat')):
+                            repeat = True
+                        else:
+                            repeat = False
+
+                try:
+                    # Repeated reads go by numeric id, the node then needn't look the keys up each time
+                    mid, vid = self.metadata.resolve(self.client, self.module, vid)
+                except EsperError:
+                    # Let the read itself report the error
+                    mid = self.module
+
+                try:
+                    done = False
+                    scheduler = monitor.RateScheduler(self.rate)
+                    while done is not True:
+                        # Fixed rate, so request latency doesn't make repeated reads drift
+                        scheduler.wait()
+                        querystring = {'mid': mid, 'vid': vid, 'offset': str(offset), 'len': str(length), 'includeData': 'y'}
+                        r = self.client.get('/read_var', querystring)
+                        if(r.status_code == 200):
+                            resp = r.json()
+                            if(len(resp['d']) > 1):
+                                for n in range(len(resp['d'])):
+                                    print("%s %s" % (str(n).rjust(5), str(resp['d'][n])))
+                            else:
+                                print(str(resp['d'][0]))
+
+                        elif(r):
+                            self.print_esper_error(r.json())
+
+                        if(not repeat):
+                            done = True
+
+                except KeyboardInterrupt:
+                    done = True
+            else:
+                # One bulk request for every variable and its data, the same one get_configuration uses
+                querystring = {'mid': self.module, 'includeVars': 'y', 'includeData': 'y'}
+                r = self.client.get('/read_module', querystring)
+                if(r.status_code == 200):
+                    mod_resp = r.json()
+                    variables = mod_resp['var']
+
+                    # Older services may leave out data or fields, fetch only those variables individually
+                    incomplete = [i for i in range(len(variables)) if not all(field in variables[i] for field in ('id', 'key', 'type', 'opt', 'stat', 'len', 'd'))]
+                    if(incomplete):
+                        with ThreadPoolExecutor(max_workers=self.client.pool_size) as executor:
+                            for i, resp in zip(incomplete, executor.map(self.read_var_preview, [variables[i] for i in incomplete])):
+                                variables[i] = resp
+
+                    print('%-5s %-32s %-16s %-8s %-8s %-32s' % ('vid', 'key', 'type', 'options', 'status', 'data'))
+                    print('%-5s %-32s %-16s %-8s %-8s %-32s' % ('---', '---', '----', '-------', '------', '----'))
+                    for resp in variables:
+                        if(resp is None):
+                            continue
+                        # Only preview the first five elements of arrays
+                        if((resp['type'] != 11) and resp['d']):
+                            resp['d'] = resp['d'][0:5]
+                        if(not resp['d']):
+                            print('%-5s %-32s %-16s %-8s %-8s %-32s' % (str(resp['id']), resp['key'], Esper().getTypeString(resp['type']), Esper().getOptionString(resp['opt']), Esper().getOptionString(resp['stat']), '%s[%d]' % ('Null', resp['len'])))
+                        elif((len(resp['d']) > 4) and (resp['type'] != 11)):
+                            print('%-5s %-32s %-16s %-8s %-8s %-32s' % (str(resp['id']), resp['key'], Esper().getTypeString(resp['type']), Esper().getOptionString(resp['opt']), Esper().getOptionString(resp['stat']), '%s[%d]' % ('Array', resp['len'])))
+                        elif(resp['type'] == 11):
+                            print('%-5s %-32s %-16s %-8s %-8s %-32s' % (str(resp['id']), resp['key'], Esper().getTypeString(resp['type']), Esper().getOptionString(resp['opt']), Esper().getOptionString(resp['stat']), '"%s"' % str(resp['d'])))
+                        else:
+                            print('%-5s %-32s %-16s %-8s %-8s %-32s' % (str(resp['id']), resp['key'], Esper().getTypeString(resp['type']), Esper().getOptionString(resp['opt']), Esper().getOptionString(resp['stat']), '%s' % str(resp['d'])))
+                elif(r):
+                    self.print_esper_error(r.json())
+
+        except requests.exceptions.RequestException as e:
+            print("Error: {}".format(e))
+
+    def is_multi_read(self, words):
+        """Whether a read line lists variables or patterns, rather than being 'read <vid> [offset] [length] [repeat]'"""
+        if(any((('/' in word) or is_pattern(word)) for word in words)):
+            return True
+        return (len(words) > 1) and (re.match(r'^(\d+|\[[\d:]*\]|r|repeat)$', words[1], re.IGNORECASE) is None)
+
+    def read_many(self, words):
+        """Read several variables at once and print them as one JSON document, bare vids are in the current module"""
+        try:
+            specs = [parse_var_spec(word if ('/' in word) else (self.module + '/' + word)) for word in words]
+            data, errors = read_var_specs(self.client, self.metadata, specs)
+        except (ValueError, EsperError) as e:
+            print(e)
+            return
+
+        print(format_document(data))
+        for name in errors:
+            print(name + ": " + errors[name])
+
+    def read_var_preview(self, var):
+        """Read a variable with its first five elements of data (all of it for strings), None on error"""
+        if(var.get('type') != 11):  # limit request length if not a string
+            querystring = {'mid': self.module, 'vid': var['id'], 'len': 5, 'includeData': 'y'}
+        else:
+            querystring = {'mid': self.module, 'vid': var['id'], 'includeData': 'y'}
+        r = self.client.get('/read_var', querystring)
+        if(r.status_code == 200):
+            return r.json()
+        return None
+
+    def complete_watch(self, content, line, begidx, endidx):
+        if content:
+            return [
+                variable for variable in self.var_completion
+                if variable.startswith(content)
+            ]
+        else:
+            return self.var_completion
+
+    def do_watch(self, line):
+        """Purpose: Read several variables concurrently at the sample rate until CTRL+C\nUsage: watch <vid>[offset:len] [<vid> ...]\nExample: watch ch0 ch1 buf[0:4]\n"""
+        if(not line.strip()):
+            print("Missing variable(s) to watch\nwatch <vid> [<vid> ...]")
+            return
+
+        try:
+            # Variables are in the current module unless given as mid/vid
+            specs = [parse_var_spec(arg if '/' in arg else self.module + '/' + arg) for arg in str.split(line)]
+        except ValueError as e:
+            print(e)
+            return
+
+        try:
+            watcher = monitor.Watcher(self.client, [self.metadata.resolve_spec(self.client, spec) for spec in specs], self.rate)
+        except EsperError as e:
+            print(e)
+            return
+
+        try:
+            watcher.run(monitor.WatchWriter(sys.stdout, specs))
+        except KeyboardInterrupt:
+            print("")
+
+    def complete_upload(self, content, line, begidx, endidx):
+        if content:
+            return [
+                variable for variable in self.var_completion
+                if variable.startswith(content)
+            ]
+        else:
+            return self.var_completion
+
+    def do_upload(self, line):
+        """Purpose: Upload a binary file to variable\nUsage: upload <vid> <file>"""
+        try:
+            if(line):
+                line_args = str.split(line, ' ')
+
+                if(len(line_args) < 1):
+                    print("Missing [vid] and [file]")
+                    return
+
+                if(len(line_args) < 2):
+                    print("Missing [file]")
+                    return
+
+                vid = line_args[0].lower()
+
+                try:
+                    upload_file = open(line_args[1], 'rb')
+                except:
+                    print("Error opening file for reading")
+                    return
+            else:
+                print("Missing arugments")
+                return
+
+            try:
+                vinfo = self.metadata.variable(self.client, self.module, vid)
+            except EsperError as e:
+                print(e)
+                return
+
+            # Always use the 'max_req_size', otherwise certain flash devices like EPCQs may have issue with multiple chunks to the same block..
+            chunk_size = vinfo['max_req_size']
+            mid, vid = self.metadata.resolve(self.client, self.module, vid)
+
+            print("Uploading [%-50s]" % (" "), end="")
+            try:
+                transfer.upload(self.client, mid, vid, upload_file, chunk_size, self.window, 3, progress_bar("Uploading"), element_size=binary.esper_dtype(vinfo['type']).itemsize)
+                print("\nDone uploading " + os.path.basename(upload_file.name))
+            except (ValueError, transfer.TransferError) as e:
+                print("\nFailed to upload " + os.path.basename(upload_file.name) + ": " + str(e))
+
+        except:
+            print("Unknown error uploading file")
+
+    def complete_download(self, content, line, begidx, endidx):
+        if content:
+            return [
+                variable for variable in self.var_completion
+                if variable.startswith(content)
+            ]
+        else:
+            return self.var_completion
+
+    def do_download(self, line):
+        """Purpose: Download a variable to a binary file\nUsage: download <vid> <file>"""
+        # Keys should always be lower case
+        try:
+            if(line):
+                line_args = str.split(line, ' ')
+
+                if(len(line_args) < 1):
+                    print("Missing <vid> and <file>")
+                    return
+
+                if(len(line_args) < 2):
+                    print("Missing <file>")
+                    return
+
+                vid = line_args[0].lower()
+
+                try:
+                    download_file = open(line_args[1], 'w+b')
+                except:
+                    print("Error opening file for writing")
+                    return
+            else:
+                print("Missing arugments")
+                return
+
+            try:
+                vinfo = self.metadata.variable(self.client, self.module, vid)
+            except EsperError as e:
+                print(e)
+                download_file.close()
+                return
+
+            # Always use the 'max_req_size', otherwise certain flash devices like EPCQs may have issue with multiple chunks to the same block..
+            chunk_size = vinfo['max_req_size']
+            # len counts elements, the file holds their bytes
+            element_size = binary.esper_dtype(vinfo['type']).itemsize
+            file_size = vinfo['len'] * element_size
+            mid, vid = self.metadata.resolve(self.client, self.module, vid)
+
+            print("Downloading [%-50s]" % (" "), end="")
+            try:
+                transfer.download(self.client, mid, vid, download_file, file_size, chunk_size, self.window, 3, progress_bar("Downloading"), None, element_size)
+                print("\nDone download to " + os.path.basename(download_file.name))
+            except transfer.TransferError as e:
+                print("\nFailed to download " + os.path.basename(download_file.name) + ": " + str(e))
+            finally:
+                download_file.close()
+        except:
+            print("Unknown error downloading file")
+
+    def do_exit(self, line):
+        """Purpose: Quit esper-tool\nUsage: exit\n"""
+        return True
+
+    def do_quit(self, line):
+        """Purpose: Quit esper-tool\nUsage: quit\n"""
+        return True
@@ -0,0 +1,169 @@
+"""
+ESPER Metadata Cache
+"""
+
+# Added for python2 compat
+from __future__ import (absolute_import, division, print_function, unicode_literals)
+from builtins import str
+
+import os
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .client import EsperError
+
+# Seconds cached descriptors are trusted for before being fetched again
+DEFAULT_TTL = 600
+
+# Fields transfers and writes need, descriptors missing any are completed with a read_var
+VARIABLE_FIELDS = ('id', 'key', 'type', 'len', 'opt', 'max_req_size')
+
+
+class MetadataCache(object):
+    """Module and variable descriptors of ESPER nodes, keyed by node URL
+
+    Descriptors (type, len, opt, max_req_size, ...) and the key <-> id maps of each
+    node are kept for ttl seconds, so repeated lookups don't go back to the node.
+    Modules and variables can be looked up by key or numeric id. Descriptors never
+    hold data, status, write counts or timestamps, those always come from the node.
+
+    If path is given the cache is loaded from and saved to that JSON file, so
+    separate runs of the tool share it. Lookups that fail raise EsperError.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL, path=None):
+        self.ttl = ttl
+        self.path = path
+        self.lock = threading.Lock()
+        self.nodes = dict()
+        if(path):
+            self.load()
+
+    def node(self, url):
+        """Cache entry for a node, created empty if needed"""
+        with self.lock:
+            if(url not in self.nodes):
+                self.nodes[url] = {'modules': None, 'module': {}, 'module_ids': {}}
+            return self.nodes[url]
+
+    def fresh(self, entry):
+        return (entry is not None) and ((self.ttl is None) or (time.time() - entry['time'] < self.ttl))
+
+    def modules(self, client):
+        """List of {'id', 'key', 'name'} for every module on the client's node"""
+        node = self.node(client.url)
+        if(not self.fresh(node['modules'])):
+            r = client.get('/read_node', {'includeMods': 'y'})
+            if(r.status_code != 200):
+                raise EsperError(r)
+            modules = [{'id': mod['id'], 'key': mod['key'], 'name': mod.get('name', '')} for mod in r.json()['module']]
+            with self.lock:
+                node['modules'] = {'time': time.time(), 'list': modules}
+                for mod in modules:
+                    node['module_ids'][str(mod['id'])] = mod['key']
+            self.save()
+        return node['modules']['list']
+
+    def module(self, client, mid):
+        """Descriptor of a module by key or id, its variables listed in 'var'"""
+        node = self.node(client.url)
+        mid = str(mid).lower()
+        entry = node['module'].get(node['module_ids'].get(mid, mid))
+        if(not self.fresh(entry)):
+            r = client.get('/read_module', {'mid': mid, 'includeVars': 'y'})
+            if(r.status_code != 200):
+                raise EsperError(r)
+            resp = r.json()
+            variables = [dict((field, var[field]) for field in var if field not in ('d', 'stat', 'ts', 'wc')) for var in resp.get('var', [])]
+            entry = {
+                'time': time.time(),
+                'id': resp['id'],
+                'key': resp['key'],
+                'name': resp.get('name', ''),
+                'var': variables,
+                'var_ids': dict((str(var['id']), var['key']) for var in variables)
+            }
+            with self.lock:
+                node['module'][resp['key']] = entry
+                node['module_ids'][str(resp['id'])] = resp['key']
+            self.save()
+        return entry
+
+    def variable(self, client, mid, vid):
+        """Descriptor of a variable by module and variable key or id"""
+        module = self.module(client, mid)
+        vid = str(vid).lower()
+        vkey = module['var_ids'].get(vid, vid)
+        for var in module['var']:
+            if(var['key'] == vkey):
+                if(all(field in var for field in VARIABLE_FIELDS)):
+                    return var
+                break
+
+        # Unknown to the module listing, or the service leaves fields out of it
+        r = client.get('/read_var', {'mid': module['key'], 'vid': vid, 'includeData': 'n'})
+        if(r.status_code != 200):
+            raise EsperError(r)
+        var = dict((field, value) for field, value in r.json().items() if field not in ('d', 'stat', 'ts', 'wc'))
+        with self.lock:
+            module['var'] = [v for v in module['var'] if v['key'] != var['key']] + [var]
+            module['var_ids'][str(var['id'])] = var['key']
+        self.save()
+        return var
+
+    def resolve(self, client, mid, vid):
+        """Numeric (module id, variable id) of a variable given by key or id
+
+        Requests addressed by id save the node looking keys up on every call, which
+        adds up over transfer chunks and polling loops.
+        """
+        var = self.variable(client, mid, vid)
+        return (self.module(client, mid)['id'], var['id'])
+
+    def resolve_spec(self, client, spec):
+        """VarSpec addressed by numeric ids instead of keys"""
+        mid, vid = self.resolve(client, spec.mid, spec.vid)
+        return spec._replace(mid=mid, vid=vid)
+
+    def index(self, client, jobs=1):
+        """Build the whole key <-> id index of a node, returns {module key: module descriptor}
+
+        One read_node plus one read_module per module, up to jobs at once.
+        """
+        modules = self.modules(client)
+        with ThreadPoolExecutor(max_workers=max(1, int(jobs))) as executor:
+            entries = list(executor.map(lambda module: self.module(client, module['key']), modules))
+        return dict((entry['key'], entry) for entry in entries)
+
+    def refresh(self, url=None):
+        """Forget everything cached for a node, or every node if url is None"""
+        with self.lock:
+            if(url is None):
+                self.nodes.clear()
+            else:
+                self.nodes.pop(url, None)
+        self.save()
+
+    def load(self):
+        try:
+            with open(self.path, 'r') as f:
+                self.nodes = json.load(f)
+        except (IOError, OSError, ValueError):
+            # Missing or unreadable cache is the same as an empty one
+            self.nodes = dict()
+
+    def save(self):
+        if(not self.path):
+            return
+        with self.lock:
+            data = json.dumps(self.nodes)
+        try:
+            # Write then rename so a concurrent run never reads a half written cache
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                f.write(data)
+            getattr(os, 'replace', os.rename)(tmp_path, self.path)
+        except (IOError, OSError):
+            pass
@@ -0,0 +1,174 @@
+"""
+ESPER Variable Monitoring
+"""
+
+# Added for python2 compat
+from __future__ import (absolute_import, division, print_function, unicode_literals)
+
+import csv
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .varspec import format_var_spec
+
+WATCH_FORMATS = ('text', 'csv', 'jsonl')
+
+# Returned by ChangeTracker for variables that haven't changed since the last sample
+UNCHANGED = object()
+
+
+def parse_rate(rate):
+    """Samples per second as a float, raising ValueError unless it is a number above 0"""
+    try:
+        value = float(rate)
+    except (TypeError, ValueError):
+        raise ValueError("Rate must be a number of samples per second, got '%s'" % rate)
+    # Also rejects nan
+    if(not (value > 0)):
+        raise ValueError("Rate must be above 0 samples per second, got '%s'" % rate)
+    return value
+
+
+class RateScheduler(object):
+    """Fixed rate ticks that don't drift with request latency
+
+    Tick n is due at start + n / rate, no matter how long the work between ticks
+    took. If the work overruns one or more whole periods those ticks are skipped
+    (and counted in missed) rather than fired back to back to catch up.
+    """
+
+    def __init__(self, rate):
+        self.period = 1.0 / parse_rate(rate)
+        self.start = None
+        self.ticks = 0
+        self.missed = 0
+
+    def wait(self):
+        """Sleep until the next tick is due, returns the time it was due at"""
+        now = time.time()
+        if(self.start is None):
+            self.start = now
+            return now
+
+        self.ticks += 1
+        due = self.start + self.ticks * self.period
+        if(due < now):
+            late = int((now - due) / self.period)
+            self.missed += late
+            self.ticks += late
+            due = self.start + self.ticks * self.period
+        if(due > now):
+            time.sleep(due - now)
+        return due
+
+
+def read_spec(client, spec):
+    """Read a variable's data for a VarSpec, None if the read failed"""
+    querystring = {'mid': spec.mid, 'vid': spec.vid, 'offset': spec.offset, 'len': spec.length, 'dataOnly': 'y'}
+    r = client.get('/read_var', querystring)
+    if(r.status_code == 200):
+        return r.json()
+    return None
+
+
+class ChangeTracker(object):
+    """Watcher poll function that only fetches data once a variable has changed
+
+    Each tick reads just the variable's metadata (includeData=n). The data itself is
+    only fetched when the write count ('wc') or timestamp ('ts') differs from the last
+    sample, otherwise UNCHANGED is returned. Services that don't report wc/ts get a
+    full read every tick. Note that only writes through ESPER move wc/ts, so values
+    updated behind its back are only seen when something else changes them.
+    """
+
+    def __init__(self):
+        self.stamps = dict()
+
+    def __call__(self, client, spec):
+        querystring = {'mid': spec.mid, 'vid': spec.vid, 'includeData': 'n'}
+        r = client.get('/read_var', querystring)
+        if(r.status_code != 200):
+            return None
+
+        info = r.json()
+        stamp = (info.get('wc'), info.get('ts'))
+        if((stamp != (None, None)) and (self.stamps.get(spec) == stamp)):
+            return UNCHANGED
+
+        value = read_spec(client, spec)
+        if(value is not None):
+            self.stamps[spec] = stamp
+        return value
+
+
+class Watcher(object):
+    """Poll a set of variables at a fixed rate, reading all of them concurrently each tick"""
+
+    def __init__(self, client, specs, rate=1.0, poll=read_spec):
+        self.client = client
+        self.specs = list(specs)
+        self.scheduler = RateScheduler(rate)
+        self.poll = poll
+        self.executor = ThreadPoolExecutor(max_workers=max(1, min(len(self.specs), client.pool_size)))
+
+    def sample(self):
+        """Wait for the next tick and read every variable, returns (tick time, [values])"""
+        tick = self.scheduler.wait()
+        values = list(self.executor.map(lambda spec: self.poll(self.client, spec), self.specs))
+        return (tick, values)
+
+    def run(self, emit, count=0, duration=0):
+        """Call emit(tick time, [values]) every tick until count samples or duration seconds, 0 for forever"""
+        samples = 0
+        end = (time.time() + duration) if duration else None
+        try:
+            while(((not count) or (samples < count)) and ((end is None) or (time.time() < end))):
+                tick, values = self.sample()
+                emit(tick, values)
+                samples += 1
+        finally:
+            self.executor.shutdown(wait=False)
+        return samples
+
+
+class WatchWriter(object):
+    """Write watch samples to a stream as text, csv or jsonl"""
+
+    def __init__(self, stream, specs, fmt='text'):
+        self.stream = stream
+        self.names = [format_var_spec(spec) for spec in specs]
+        self.fmt = fmt
+        if(fmt == 'csv'):
+            self.writer = csv.writer(stream)
+            self.writer.writerow(['time'] + self.names)
+
+    def __call__(self, tick, values):
+        # Only variables that changed are written, and nothing at all if none did
+        changed = [(name, value) for name, value in zip(self.names, values) if value is not UNCHANGED]
+        if(not changed):
+            return
+
+        if(self.fmt == 'jsonl'):
+            self.stream.write(json.dumps({'time': tick, 'values': dict(changed)}) + '\n')
+        elif(self.fmt == 'csv'):
+            self.writer.writerow(['%.6f' % tick] + [self.cell(value) for value in values])
+        else:
+            self.stream.write('%.3f %s\n' % (tick, ' '.join('%s=%s' % (name, json.dumps(self.scalar(value))) for name, value in changed)))
+        self.stream.flush()
+
+    def scalar(self, value):
+        # Single element reads come back as one element arrays, show them as plain values
+        if(isinstance(value, list) and (len(value) == 1)):
+            return value[0]
+        return value
+
+    def cell(self, value):
+        if(value is UNCHANGED):
+            return ''
+        value = self.scalar(value)
+        if(isinstance(value, (list, dict))):
+            return json.dumps(value)
+        if(value is None):
+            return ''
+        return value
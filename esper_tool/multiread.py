@@ -0,0 +1,118 @@
+"""
+ESPER Multi-Variable Reads
+"""
+
+# Added for python2 compat
+from __future__ import (absolute_import, division, print_function, unicode_literals)
+
+import json
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from fnmatch import fnmatchcase
+
+from .client import EsperError
+from .varspec import format_var_spec
+
+# Characters that make a mid or vid a pattern over the node's keys rather than a key
+GLOB_CHARS = '*?'
+
+
+def is_pattern(key):
+    return any(char in str(key) for char in GLOB_CHARS)
+
+
+def expand_var_specs(client, metadata, specs):
+    """Expand glob patterns over the node's key index
+
+    Returns (reads, modules): reads is a list of (name, VarSpec) in the order given,
+    and modules the keys of modules a spec covered entirely (ie: 'adc/*'), which can
+    be read with a single read_module. Specs without patterns are passed through
+    untouched, named as given. Raises ValueError for a pattern that matches nothing
+    and EsperError if the key index can't be read.
+    """
+    reads = []
+    modules = []
+    for spec in specs:
+        if(not (is_pattern(spec.mid) or is_pattern(spec.vid))):
+            reads.append((format_var_spec(spec), spec))
+            continue
+
+        if(is_pattern(spec.mid)):
+            mkeys = [module['key'] for module in metadata.modules(client) if fnmatchcase(module['key'], spec.mid)]
+        else:
+            mkeys = [metadata.module(client, spec.mid)['key']]
+
+        matched = 0
+        for mkey in mkeys:
+            variables = metadata.module(client, mkey)['var']
+            vkeys = [var['key'] for var in variables if fnmatchcase(var['key'], spec.vid)]
+            matched += len(vkeys)
+            if(vkeys and (len(vkeys) == len(variables)) and (not spec.offset) and (not spec.length)):
+                modules.append(mkey)
+            for vkey in vkeys:
+                target = spec._replace(mid=mkey, vid=vkey)
+                reads.append((format_var_spec(target), target))
+
+        if(not matched):
+            raise ValueError("%s matched no variables" % format_var_spec(spec))
+
+    return (reads, modules)
+
+
+def read_var_specs(client, metadata, specs, jobs=None):
+    """Read many VarSpecs at once, glob patterns allowed
+
+    Every module a spec covers entirely is fetched with one read_module, the rest
+    of the variables are read individually by numeric id, up to jobs (default: the
+    client's pool size) requests at a time. Returns (OrderedDict of name -> data,
+    {name: error message}), failed reads having None as their data.
+    """
+    reads, modules = expand_var_specs(client, metadata, specs)
+    # Each variable only once, even if several specs matched it
+    reads = list(OrderedDict(reads).items())
+
+    def read_module(mkey):
+        """{var key: data} for every variable of a module that came back with its data"""
+        module = metadata.module(client, mkey)
+        r = client.get('/read_module', {'mid': module['id'], 'includeVars': 'y', 'includeData': 'y'})
+        if(r.status_code != 200):
+            return dict()
+        return dict((var['key'], var['d']) for var in r.json().get('var', []) if 'd' in var)
+
+    def read_var(spec):
+        try:
+            mid, vid = metadata.resolve(client, spec.mid, spec.vid)
+        except EsperError as e:
+            return (None, str(e))
+        r = client.get('/read_var', {'mid': mid, 'vid': vid, 'offset': spec.offset, 'len': spec.length, 'dataOnly': 'y'})
+        if(r.status_code != 200):
+            return (None, str(EsperError(r)))
+        return (r.json(), None)
+
+    data = OrderedDict((name, None) for name, spec in reads)
+    errors = dict()
+    with ThreadPoolExecutor(max_workers=max(1, int(jobs or client.pool_size))) as executor:
+        module_data = dict(zip(modules, executor.map(read_module, modules)))
+
+        # Anything read_module didn't return (older services leave data out) is read on its own
+        remaining = []
+        for name, spec in reads:
+            values = module_data.get(spec.mid, {})
+            if((spec.vid in values) and (not spec.offset) and (not spec.length)):
+                data[name] = values[spec.vid]
+            else:
+                remaining.append((name, spec))
+
+        for (name, spec), (value, error) in zip(remaining, executor.map(read_var, [spec for name, spec in remaining])):
+            data[name] = value
+            if(error is not None):
+                errors[name] = error
+
+    return (data, errors)
+
+
+def format_document(data):
+    """JSON object of the data read, one variable per line so long arrays stay readable"""
+    if(not data):
+        return '{}'
+    return '{\n' + ',\n'.join('  %s: %s' % (json.dumps(name), json.dumps(value)) for name, value in data.items()) + '\n}'
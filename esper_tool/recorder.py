@@ -0,0 +1,208 @@
+"""
+ESPER Time-Series Recording
+"""
+
+# Added for python2 compat
+from __future__ import (absolute_import, division, print_function, unicode_literals)
+
+import io
+import json
+import struct
+import time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+from .compare import ESPER_DTYPES, ESPER_TYPE_ASCII
+from .varspec import format_var_spec
+
+# File layout, everything little endian:
+#   magic, uint32 header length, JSON header
+#   chunk*: CHUNK_HEADER (payload length, samples, first time, last time), npz payload
+# Chunks are only ever appended, so a recording cut short (ie: power loss) reads back
+# up to its last complete chunk. The chunk headers double as the timestamp index.
+RECORDING_MAGIC = b'ESPERREC'
+HEADER_LENGTH = struct.Struct('<I')
+CHUNK_HEADER = struct.Struct('<QIdd')
+
+DEFAULT_CHUNK_SAMPLES = 1000
+
+
+def column_dtype(vinfo):
+    """NumPy dtype samples of a variable are stored as, from its read_var metadata"""
+    if(vinfo['type'] == ESPER_TYPE_ASCII):
+        return np.dtype('U%d' % max(1, vinfo['len']))
+    return np.dtype(ESPER_DTYPES.get(vinfo['type'], np.uint8)).newbyteorder('<')
+
+
+def spec_width(spec, vinfo):
+    """Number of elements each sample of spec holds"""
+    if(vinfo['type'] == ESPER_TYPE_ASCII):
+        return 1
+    return spec.length or max(1, vinfo['len'] - spec.offset)
+
+
+class Recorder(object):
+    """Append watch samples to a chunked, compressed recording file
+
+    Used as a Watcher emit function. Samples are buffered until chunk_samples have
+    been taken, then compressed into one npz chunk per flush: 'time' holds the sample
+    times, 'v<n>' a (samples, elements) array per variable and 'v<n>_ok' whether
+    each sample was read. Compression and writing run on a background thread so the
+    sampling schedule isn't held up, with at most one chunk waiting to be written.
+    """
+
+    def __init__(self, path, specs, vinfos, url=None, rate=None, chunk_samples=DEFAULT_CHUNK_SAMPLES):
+        self.specs = list(specs)
+        self.dtypes = [column_dtype(vinfo) for vinfo in vinfos]
+        self.widths = [spec_width(spec, vinfo) for spec, vinfo in zip(self.specs, vinfos)]
+        self.chunk_samples = max(1, int(chunk_samples))
+        self.samples = 0
+        self.chunks = 0
+        self.pending = None
+        self.writer = ThreadPoolExecutor(max_workers=1)
+        self.new_chunk()
+
+        header = {
+            'url': url,
+            'rate': rate,
+            'created': time.time(),
+            'vars': [{
+                'name': format_var_spec(spec),
+                'type': vinfo['type'],
+                'dtype': dtype.str,
+                'width': width
+            } for spec, vinfo, dtype, width in zip(self.specs, vinfos, self.dtypes, self.widths)]
+        }
+        header = json.dumps(header).encode('utf-8')
+
+        self.file = open(path, 'wb')
+        self.file.write(RECORDING_MAGIC + HEADER_LENGTH.pack(len(header)) + header)
+        self.file.flush()
+
+    def new_chunk(self):
+        self.times = np.empty(self.chunk_samples, dtype='<f8')
+        self.columns = [np.zeros((self.chunk_samples, width), dtype=dtype) for dtype, width in zip(self.dtypes, self.widths)]
+        self.valid = [np.zeros(self.chunk_samples, dtype=np.bool_) for spec in self.specs]
+        self.count = 0
+
+    def __call__(self, tick, values):
+        row = self.count
+        self.times[row] = tick
+        for column, valid, value in zip(self.columns, self.valid, values):
+            if(value is None):
+                continue
+            try:
+                value = np.atleast_1d(np.asarray(value, dtype=column.dtype))[:column.shape[1]]
+            except (ValueError, OverflowError, TypeError):
+                continue
+            column[row, :len(value)] = value
+            valid[row] = True
+
+        self.count += 1
+        self.samples += 1
+        if(self.count == self.chunk_samples):
+            self.flush()
+
+    def flush(self):
+        """Queue the buffered samples to be written out as a chunk"""
+        if(not self.count):
+            return
+
+        arrays = {'time': self.times[:self.count]}
+        for n, (column, valid) in enumerate(zip(self.columns, self.valid)):
+            arrays['v%d' % n] = column[:self.count]
+            arrays['v%d_ok' % n] = valid[:self.count]
+
+        # Wait out the previous chunk, keeps memory to the chunk being filled plus one
+        if(self.pending is not None):
+            self.pending.result()
+        self.pending = self.writer.submit(self.write_chunk, arrays)
+        self.new_chunk()
+
+    def write_chunk(self, arrays):
+        payload = io.BytesIO()
+        np.savez_compressed(payload, **arrays)
+        payload = payload.getvalue()
+        times = arrays['time']
+        self.file.write(CHUNK_HEADER.pack(len(payload), len(times), times[0], times[-1]))
+        self.file.write(payload)
+        self.file.flush()
+        self.chunks += 1
+
+    def close(self):
+        self.flush()
+        self.writer.shutdown(wait=True)
+        if(self.pending is not None):
+            self.pending.result()
+        self.file.close()
+
+
+class Recording(object):
+    """Read back a file written by Recorder
+
+    The header and chunk index are loaded when opened, chunk data only when read.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            if(f.read(len(RECORDING_MAGIC)) != RECORDING_MAGIC):
+                raise ValueError("%s is not an ESPER recording" % path)
+            length = HEADER_LENGTH.unpack(f.read(HEADER_LENGTH.size))[0]
+            self.header = json.loads(f.read(length).decode('utf-8'))
+
+            # (payload offset, payload length, samples, first time, last time) of each complete chunk
+            self.index = []
+            while(True):
+                chunk_header = f.read(CHUNK_HEADER.size)
+                if(len(chunk_header) < CHUNK_HEADER.size):
+                    break
+                length, samples, first, last = CHUNK_HEADER.unpack(chunk_header)
+                offset = f.tell()
+                self.index.append((offset, length, samples, first, last))
+                f.seek(length, io.SEEK_CUR)
+
+            # Drop a chunk that was cut short while being written
+            f.seek(0, io.SEEK_END)
+            if(self.index and (self.index[-1][0] + self.index[-1][1] > f.tell())):
+                self.index.pop()
+
+    @property
+    def names(self):
+        return [var['name'] for var in self.header['vars']]
+
+    def read(self, start=None, end=None):
+        """Return (times, {name: samples}, {name: valid}) for samples between start and end times
+
+        Only chunks overlapping [start, end] are decompressed.
+        """
+        times = []
+        columns = [[] for var in self.header['vars']]
+        valid = [[] for var in self.header['vars']]
+
+        with open(self.path, 'rb') as f:
+            for offset, length, samples, first, last in self.index:
+                if(((start is not None) and (last < start)) or ((end is not None) and (first > end))):
+                    continue
+                f.seek(offset)
+                with np.load(io.BytesIO(f.read(length))) as chunk:
+                    keep = np.ones(samples, dtype=np.bool_)
+                    if(start is not None):
+                        keep &= chunk['time'] >= start
+                    if(end is not None):
+                        keep &= chunk['time'] <= end
+                    times.append(chunk['time'][keep])
+                    for n in range(len(columns)):
+                        columns[n].append(chunk['v%d' % n][keep])
+                        valid[n].append(chunk['v%d_ok' % n][keep])
+
+        names = self.names
+        if(not times):
+            empty = [np.zeros((0, var['width']), dtype=np.dtype(var['dtype'])) for var in self.header['vars']]
+            return (np.zeros(0, dtype='<f8'), dict(zip(names, empty)), dict((name, np.zeros(0, dtype=np.bool_)) for name in names))
+
+        return (
+            np.concatenate(times),
+            dict((name, np.concatenate(column)) for name, column in zip(names, columns)),
+            dict((name, np.concatenate(ok)) for name, ok in zip(names, valid))
+        )
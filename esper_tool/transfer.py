@@ -0,0 +1,368 @@
+"""
+ESPER Chunked Transfers
+"""
+
+# Added for python2 compat
+from __future__ import (absolute_import, division, print_function, unicode_literals)
+
+import json
+import mmap
+import os
+import sys
+import zlib
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+class TransferError(Exception):
+    """A chunk could not be transferred"""
+
+    def __init__(self, message, status_code=None):
+        super(TransferError, self).__init__(message)
+        self.status_code = status_code
+
+
+class TransferJournal(object):
+    """Sidecar file recording every chunk of a transfer that has completed
+
+    The first line describes the transfer, each following line is one completed
+    chunk's offset, length and CRC32. A rerun of the same transfer loads it and
+    skips chunks whose checksum still matches, instead of starting again from 0.
+    """
+
+    def __init__(self, path, direction, mid, vid, size, chunk_size):
+        self.path = path
+        self.header = {'direction': direction, 'mid': str(mid), 'vid': str(vid), 'size': size, 'chunk_size': chunk_size}
+        self.completed = dict()
+        self.journal_file = None
+
+    def load(self):
+        """Load chunks completed by a previous run, if it was the same transfer"""
+        self.completed = dict()
+        try:
+            with open(self.path, 'r') as journal_file:
+                if(json.loads(journal_file.readline()) != self.header):
+                    return 0
+                for line in journal_file:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Last line may be torn if the previous run was killed mid-write
+                        break
+                    self.completed[entry['offset']] = (entry['len'], entry['crc32'])
+        except (IOError, OSError, ValueError):
+            self.completed = dict()
+        return len(self.completed)
+
+    def open(self):
+        """Start journaling, keeping any chunks loaded from a previous run"""
+        self.journal_file = open(self.path, 'w')
+        self.journal_file.write(json.dumps(self.header) + '\n')
+        for offset in sorted(self.completed):
+            length, crc = self.completed[offset]
+            self.journal_file.write(json.dumps({'offset': offset, 'len': length, 'crc32': crc}) + '\n')
+        self.journal_file.flush()
+
+    def is_complete(self, offset, data):
+        """True if this chunk was already transferred with the same contents"""
+        entry = self.completed.get(offset)
+        return (entry is not None) and (entry[0] == len(data)) and (entry[1] == checksum(data))
+
+    def record(self, offset, length, crc):
+        self.completed[offset] = (length, crc)
+        self.journal_file.write(json.dumps({'offset': offset, 'len': length, 'crc32': crc}) + '\n')
+        self.journal_file.flush()
+
+    def close(self):
+        if(self.journal_file):
+            self.journal_file.close()
+            self.journal_file = None
+
+    def remove(self):
+        """Transfer finished, the journal is no longer needed"""
+        self.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+def progress_bar(label):
+    """Returns a transfer progress callback that redraws a 50 character progress bar"""
+    def show(done, total):
+        strCompleteness = '#' * int(done / float(total) * 50)
+        print("\r%s [%-50s]" % (label, strCompleteness), end="")
+        sys.stdout.flush()
+    return show
+
+
+def checksum(data):
+    return zlib.crc32(data) & 0xffffffff
+
+
+def element_chunk_size(max_req_size, element_size):
+    """Largest chunk of whole elements that fits in max_req_size bytes, at least one element"""
+    # Never split an element across two requests
+    return max(element_size, max_req_size - (max_req_size % element_size))
+
+
+def chunk_ranges(size, chunk_size):
+    """Yield (offset, length) for each chunk needed to cover size bytes"""
+    offset = 0
+    while(offset < size):
+        length = min(chunk_size, size - offset)
+        yield (offset, length)
+        offset += length
+
+
+def run_windowed(jobs, worker, window, on_done=None):
+    """Run worker(job) for every job, keeping at most window jobs in flight
+
+    jobs is consumed lazily, so only window jobs (and their payloads) are ever held
+    in memory at once. on_done(job, result) is called from this thread as each job
+    completes. The first exception raised by a worker cancels the remaining jobs
+    and is re-raised here. A window of 1 runs every job in order on this thread.
+    """
+    if(window <= 1):
+        for job in jobs:
+            result = worker(job)
+            if(on_done):
+                on_done(job, result)
+        return
+
+    pending = dict()
+    jobs = iter(jobs)
+    with ThreadPoolExecutor(max_workers=window) as executor:
+        try:
+            exhausted = False
+            while(True):
+                while((not exhausted) and (len(pending) < window)):
+                    try:
+                        job = next(jobs)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    pending[executor.submit(worker, job)] = job
+
+                if(not pending):
+                    break
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job = pending.pop(future)
+                    result = future.result()
+                    if(on_done):
+                        on_done(job, result)
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def fetch_chunk(client, mid, vid, offset, length, retries=3, element_size=1):
+    """Read length bytes at byte offset from an ESPER variable, retrying up to retries times
+
+    Requests address elements, so for variables wider than a byte (element_size > 1)
+    offset and length must be multiples of element_size.
+    """
+    querystring = {'mid': mid, 'vid': vid, 'offset': offset // element_size, 'len': length // element_size, 'binary': 'y', 'dataOnly': 'y'}
+    retry_count = 0
+    while(True):
+        r = client.get('/read_var', querystring)
+        if((r.status_code == 200) and (len(r.content) == length)):
+            return r.content
+        elif(retry_count < retries):
+            retry_count += 1
+            print("\nDownload attempt failed, retrying...", file=sys.stderr)
+        else:
+            raise TransferError("Failed to read %d bytes at offset %d" % (length, offset), r.status_code)
+
+
+def post_chunk(client, querystring, payload, retries=3):
+    """POST one chunk to write_var, retrying up to retries times"""
+    retry_count = 0
+    while(True):
+        r = client.post('/write_var', querystring, payload)
+        if(r.status_code == 200):
+            return
+        elif(r.status_code == 405):
+            raise TransferError("Variable is Locked or Read-Only", r.status_code)
+        elif(retry_count < retries):
+            retry_count += 1
+            print("\nUpload attempt failed, retrying...", file=sys.stderr)
+        else:
+            raise TransferError("Failed to write %d byte chunk at offset %d" % (len(payload), querystring['offset']), r.status_code)
+
+
+def write_chunk(client, mid, vid, offset, payload, retries=3, element_size=1):
+    """Write payload bytes at byte offset of an ESPER variable with a binary write
+
+    As with fetch_chunk, requests address elements, so for variables wider than a
+    byte offset and len(payload) must be multiples of element_size.
+    """
+    querystring = {'mid': mid, 'vid': vid, 'offset': offset // element_size, 'len': len(payload) // element_size, 'binary': 'y'}
+    post_chunk(client, querystring, payload, retries)
+
+
+def upload(client, mid, vid, upload_file, chunk_size, window=1, retries=3, progress=None, journal=None, diff=False, element_size=1):
+    """Upload the contents of upload_file to an ESPER variable using binary writes
+
+    Chunks are always chunk_size (the variable's 'max_req_size') bytes. With a window
+    of 1 chunks are written strictly in order, one at a time, which is what flash
+    backed variables (ie: EPCQs) need. Larger windows keep that many chunks in flight
+    over the client's pooled connections. Each chunk is retried up to retries times.
+    progress(bytes_done, file_size) is called after every chunk. If a TransferJournal
+    is given, chunks it has already recorded are skipped and new ones are added to it.
+    With diff set each chunk is read back from the device first and only written if
+    it differs, sparing flash backed variables needless erase/write cycles.
+    element_size is the size in bytes of one element of the variable; chunks are
+    kept to whole elements, and a file that isn't a whole number of elements raises
+    ValueError before anything is sent. Returns the number of bytes actually written
+    to the device.
+    """
+    chunk_size = element_chunk_size(chunk_size, element_size)
+
+    upload_file.seek(0, os.SEEK_END)
+    file_size = upload_file.tell()
+    upload_file.seek(0, os.SEEK_SET)
+    if(file_size % element_size):
+        raise ValueError("%d bytes isn't a whole number of %d byte elements" % (file_size, element_size))
+
+    done = [0]
+    written = [0]
+
+    def read_chunks():
+        for offset, length in chunk_ranges(file_size, chunk_size):
+            upload_file.seek(offset, os.SEEK_SET)
+            payload = upload_file.read(length)
+            if(journal and journal.is_complete(offset, payload)):
+                chunk_done((offset, payload), (length, None, False))
+            else:
+                yield (offset, payload)
+
+    def send_chunk(job):
+        offset, payload = job
+        if(diff and (fetch_chunk(client, mid, vid, offset, len(payload), retries, element_size) == payload)):
+            return (len(payload), checksum(payload) if journal else None, False)
+
+        write_chunk(client, mid, vid, offset, payload, retries, element_size)
+        return (len(payload), checksum(payload) if journal else None, True)
+
+    def chunk_done(job, result):
+        length, crc, wrote = result
+        if(journal and (crc is not None)):
+            journal.record(job[0], length, crc)
+        if(wrote):
+            written[0] += length
+        done[0] += length
+        if(progress):
+            progress(done[0], file_size)
+
+    run_windowed(read_chunks(), send_chunk, window, chunk_done)
+    return written[0]
+
+
+def upload_from(client, mid, vid, buffer, chunk_size, window=1, retries=3, progress=None, element_size=1, element_offset=0):
+    """Write a buffer (bytes, mmap, NumPy array) to an ESPER variable using binary writes
+
+    The opposite of download_into: the whole buffer is written starting at
+    element_offset, in chunk_size chunks of whole elements taken straight from it, up
+    to window at once. progress(bytes_done, size) is called after every chunk.
+    Raises ValueError, before anything is sent, if the buffer isn't a whole number
+    of elements. Returns the number of chunks written.
+    """
+    view = memoryview(buffer).cast('B')
+    size = len(view)
+    if(size % element_size):
+        view.release()
+        raise ValueError("%d bytes isn't a whole number of %d byte elements" % (size, element_size))
+    chunk_size = element_chunk_size(chunk_size, element_size)
+    base = element_offset * element_size
+    done = [0, 0]
+
+    def send_chunk(job):
+        offset, length = job
+        write_chunk(client, mid, vid, base + offset, bytes(view[offset:offset + length]), retries, element_size)
+        return length
+
+    def chunk_done(job, length):
+        done[0] += length
+        done[1] += 1
+        if(progress):
+            progress(done[0], size)
+
+    try:
+        run_windowed(chunk_ranges(size, chunk_size), send_chunk, window, chunk_done)
+    finally:
+        view.release()
+
+    return done[1]
+
+
+def download_into(client, mid, vid, buffer, chunk_size, window=1, retries=3, progress=None, journal=None, element_size=1, element_offset=0):
+    """Download an ESPER variable into a writable buffer (mmap, bytearray, NumPy array) using binary reads
+
+    The buffer's length in bytes sets how much is read, starting at element_offset.
+    Each chunk is copied straight from the response into its own slot of the buffer,
+    so chunks may complete in any order. Up to window chunks are fetched at once,
+    bounding memory to window * chunk_size. Each chunk is retried up to retries times.
+    progress(bytes_done, size) is called after every chunk. If a TransferJournal is
+    given, chunks it has recorded that are still intact in the buffer are skipped and
+    newly fetched ones are added to it. element_size is the size in bytes of one
+    element of the variable; chunks are kept to whole elements.
+    """
+    view = memoryview(buffer).cast('B')
+    size = len(view)
+    chunk_size = element_chunk_size(chunk_size, element_size)
+    base = element_offset * element_size
+
+    def read_chunk(job):
+        offset, length = job
+        content = fetch_chunk(client, mid, vid, base + offset, length, retries, element_size)
+        view[offset:offset + length] = content
+        return (length, checksum(content) if journal else None)
+
+    done = [0]
+
+    def chunk_done(job, result):
+        length, crc = result
+        if(journal and (crc is not None)):
+            journal.record(job[0], length, crc)
+        done[0] += length
+        if(progress):
+            progress(done[0], size)
+
+    def missing_chunks():
+        for offset, length in chunk_ranges(size, chunk_size):
+            if(journal and journal.is_complete(offset, view[offset:offset + length])):
+                chunk_done((offset, length), (length, None))
+            else:
+                yield (offset, length)
+
+    try:
+        run_windowed(missing_chunks(), read_chunk, window, chunk_done)
+    finally:
+        view.release()
+
+    return size
+
+
+def download(client, mid, vid, download_file, file_size, chunk_size, window=1, retries=3, progress=None, journal=None, element_size=1):
+    """Download file_size bytes of an ESPER variable into download_file using binary reads
+
+    download_file must be opened for update ('w+b', or 'r+b' to resume). It is
+    preallocated to file_size (the variable's length times element_size) and memory
+    mapped, and chunks are written straight into place by download_into(), which
+    describes the remaining arguments.
+    """
+    download_file.truncate(file_size)
+    download_file.flush()
+    if(file_size == 0):
+        return 0
+
+    file_map = mmap.mmap(download_file.fileno(), file_size, access=mmap.ACCESS_WRITE)
+    try:
+        download_into(client, mid, vid, file_map, chunk_size, window, retries, progress, journal, element_size)
+        file_map.flush()
+    finally:
+        file_map.close()
+
+    return file_size
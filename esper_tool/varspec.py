@@ -0,0 +1,45 @@
+"""
+ESPER Variable Specifiers
+"""
+
+# Added for python2 compat
+from __future__ import (absolute_import, division, print_function, unicode_literals)
+
+import re
+from collections import namedtuple
+
+VarSpec = namedtuple('VarSpec', ['mid', 'vid', 'offset', 'length'])
+
+# mid/vid, mid/vid[offset], mid/vid[offset:len] or mid/vid[offset:]
+VAR_SPEC_RE = re.compile(r'^/?([^/\[\]\s]+)/([^/\[\]\s]+)(?:\[(\d+)(?::(\d*))?\])?$')
+
+
+def parse_var_spec(text):
+    """Parse 'mid/vid[offset:len]' into a VarSpec, raising ValueError if it isn't one
+
+    Keys are lowercased like everywhere else. [offset] alone is a single element,
+    [offset:] everything from offset on, and no brackets the whole variable. A length
+    of 0 means "to the end", as it does for read_var.
+    """
+    match = VAR_SPEC_RE.match(text.strip())
+    if(match is None):
+        raise ValueError("Expected mid/vid or mid/vid[offset:len], got '%s'" % text)
+
+    mid, vid, offset, length = match.groups()
+    if(offset is None):
+        return VarSpec(mid.lower(), vid.lower(), 0, 0)
+    if(length is None):
+        return VarSpec(mid.lower(), vid.lower(), int(offset), 1)
+    return VarSpec(mid.lower(), vid.lower(), int(offset), int(length or 0))
+
+
+def format_var_spec(spec):
+    """Inverse of parse_var_spec"""
+    name = spec.mid + '/' + spec.vid
+    if(spec.length == 1):
+        name += '[%d]' % spec.offset
+    elif(spec.length):
+        name += '[%d:%d]' % (spec.offset, spec.length)
+    elif(spec.offset):
+        name += '[%d:]' % spec.offset
+    return name